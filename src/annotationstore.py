@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Annotation store
+
+Annotations of segments, as columns of integer codes: one column per layer and annotation type, for annotations and
+legacy annotations, each row holding the annotations of one segment, coded by their ids in the collection's symbol table.
+
+Each column is indexed on its first selection by an inverted index of its rows by code, then kept up to date as rows
+change, so that selections only depend on the number of matching rows. Indexes are built with NumPy when it is
+installed, and in Python otherwise.
+"""
+
+from array import array
+from collections import OrderedDict
+
+from bitmap import Bitmap
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # columns are indexed in Python
+
+PRESENCE = None  # annotation type of the columns recording which segments have a layer, the layer being their value
+
+
+class Column:
+    """
+    Symbol ids of the values of one annotation type of one layer, by row, 0 standing for no value
+    """
+    __slots__ = ["symbols", "codes", "postings"]
+
+    def __init__(self, symbols, size=0):
+        """
+        Initializes a column of empty rows
+        """
+        self.symbols = symbols
+        self.codes = array("I", [0]) * size
+        self.postings = None  # rows, by code, built on first selection
+
+    def decode(self, row):
+        """
+        Returns the value of a row, None if it has none
+        """
+        return self.symbols[self.codes[row]]
+
+    def set(self, row, code):
+        """
+        Sets the code of a row, updating the index
+        """
+        previous = self.codes[row]
+
+        if previous == code:
+            return
+
+        self.codes[row] = code
+
+        if self.postings is not None:
+            if previous:
+                rows = self.postings[previous]
+                rows.discard(row)
+
+                # empty postings are dropped
+                if not rows:
+                    del self.postings[previous]
+
+            if code:
+                self.postings.setdefault(code, set()).add(row)
+
+    def index(self):
+        """
+        Returns the rows, by code, building the index if needed
+        """
+        if self.postings is None:
+            self.postings = {}
+
+            if numpy is not None:
+                codes = numpy.frombuffer(self.codes, dtype="I") if self.codes else numpy.zeros(0, dtype="I")
+
+                # rows sorted by code, then split where the code changes
+                rows = numpy.flatnonzero(codes)
+                rows = rows[numpy.argsort(codes[rows], kind="stable")]
+                values, starts = numpy.unique(codes[rows], return_index=True)
+
+                for code, group in zip(values.tolist(), numpy.split(rows, starts[1:])):
+                    self.postings[code] = set(group.tolist())
+            else:
+                for row, code in enumerate(self.codes):
+                    if code:
+                        self.postings.setdefault(code, set()).add(row)
+
+        return self.postings
+
+    def select(self, value=None):
+        """
+        Returns the bitmap of the rows with a value, or with any value
+        """
+        postings = self.index()
+
+        if value is None:
+            return Bitmap.from_rows(row for rows in postings.values() for row in rows)
+
+        return Bitmap.from_rows(postings.get(self.symbols.lookup(value), ()))
+
+
+class AnnotationStore:
+    """
+    Annotations of segments, identified by their ids, as columns of codes
+    """
+    def __init__(self, symbols):
+        """
+        Initializes an empty store, coding values with a symbol table
+        """
+        self.symbols = symbols
+        self.rows = {}  # rows, by segment id
+        self.ids = []  # segment ids, by row, None for free rows
+        self.free = []  # rows of removed segments, reused first
+        self.columns = {}  # columns, by (layer, annotation type, legacy)
+
+    @staticmethod
+    def entries(annotations, legacy):
+        """
+        Returns the values of annotation dicts, by column key
+        """
+        entries = {}
+
+        for is_legacy, dic in [(False, annotations), (True, legacy)]:
+            for layer, values in dic.items():
+                entries[(layer, PRESENCE, is_legacy)] = layer
+
+                for annotation_type, value in values.items():
+                    entries[(layer, annotation_type, is_legacy)] = value
+
+        return entries
+
+    def set_row(self, identifier, annotations, legacy):
+        """
+        Stores the annotations and legacy annotations of a segment, as dicts of {"label": ..., "qualifier": ...} by layer
+        """
+        row = self.rows.get(identifier)
+
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+                self.ids[row] = identifier
+            else:
+                row = len(self.ids)
+                self.ids.append(identifier)
+
+                for column in self.columns.values():
+                    column.codes.append(0)
+
+            self.rows[identifier] = row
+
+        entries = AnnotationStore.entries(annotations, legacy)
+
+        for key, column in self.columns.items():
+            column.set(row, self.symbols.code(entries.pop(key, None)))
+
+        # values of new columns
+        for key, value in entries.items():
+            column = self.columns[key] = Column(self.symbols, len(self.ids))
+            column.set(row, self.symbols.code(value))
+
+    def remove_row(self, identifier):
+        """
+        Removes the annotations of a segment
+        """
+        row = self.rows.pop(identifier, None)
+
+        if row is not None:
+            for column in self.columns.values():
+                column.set(row, 0)
+
+            self.ids[row] = None
+            self.free.append(row)
+
+    def get(self, identifier, layer, annotation_type="label", legacy=False):
+        """
+        Returns an annotation of a segment, None if it has none
+        """
+        row = self.rows.get(identifier)
+        column = self.columns.get((layer, annotation_type, legacy))
+
+        if row is None or column is None:
+            return None
+
+        return column.decode(row)
+
+    def select(self, layer, annotation_type="label", value=None, legacy=False):
+        """
+        Returns the bitmap of the segments with a value, or with any value, for an annotation type of a layer
+        """
+        column = self.columns.get((layer, annotation_type, legacy))
+
+        if column is None:
+            return Bitmap()
+
+        return column.select(value)
+
+    def select_layer(self, layer, legacy=False):
+        """
+        Returns the bitmap of the segments with a layer
+        """
+        return self.select(layer, PRESENCE, layer, legacy)
+
+    def select_in_any_layer(self, value, annotation_type="label", legacy=False):
+        """
+        Returns the bitmap of the segments with a value for an annotation type of any layer
+        """
+        bitmap = Bitmap()
+
+        for (layer, t, is_legacy), column in self.columns.items():
+            if t == annotation_type and is_legacy == legacy:
+                bitmap |= column.select(value)
+
+        return bitmap
+
+    def get_vocabulary(self, annotation_type="label", legacy=False):
+        """
+        Returns the values of an annotation type in any layer, or the layers if the type is PRESENCE, with their number of segments
+        """
+        vocabulary = OrderedDict()
+
+        for (layer, t, is_legacy), column in self.columns.items():
+            if t == annotation_type and is_legacy == legacy:
+                for code, rows in column.index().items():
+                    value = self.symbols[code]
+                    vocabulary[value] = vocabulary.get(value, 0) + len(rows)
+
+        return vocabulary
+
+    def select_ids(self, identifiers):
+        """
+        Returns the bitmap of segments
+        """
+        return Bitmap.from_rows(self.rows[identifier] for identifier in identifiers if identifier in self.rows)
+
+    def select_all(self):
+        """
+        Returns the bitmap of all the segments
+        """
+        return Bitmap((1 << len(self.ids)) - 1) - Bitmap.from_rows(self.free)
+
+    def get_ids(self, bitmap):
+        """
+        Returns the ids of the segments of a bitmap
+        """
+        return [self.ids[row] for row in bitmap.rows()]
+
+    def find(self, layer, annotation_type="label", value=None, legacy=False):
+        """
+        Returns the ids of the segments with a value, or with any value, for an annotation type of a layer
+        """
+        return set(self.get_ids(self.select(layer, annotation_type, value, legacy)))
+
+    def find_layer(self, layer, legacy=False):
+        """
+        Returns the ids of the segments with a layer
+        """
+        return set(self.get_ids(self.select_layer(layer, legacy)))
+
+    def find_in_any_layer(self, value, annotation_type="label", legacy=False):
+        """
+        Returns the ids of the segments with a value for an annotation type of any layer
+        """
+        return set(self.get_ids(self.select_in_any_layer(value, annotation_type, legacy)))
@@ -11,6 +11,8 @@
 Annotation methods
 """
 
+import logging
+
 from time import time
 from collections import OrderedDict
 from copy import deepcopy
@@ -19,10 +21,13 @@ from tkinter import filedialog, messagebox, colorchooser, Menu, LEFT, END, SEL_F
 from tkinter.ttk import Button
 from undo import stack, undoable, group
 
+from autosave import AutosaveWorker
+from backup import BackupStore
 from colors import generate_random_color
 from config import ConfigFile
 from interface import GraphicalUserInterface
-from model import SegmentCollection
+from model import LazySegment, SegmentCollection, DAY, MINUTE, PRESENCE
+from profiler import StartupProfiler
 
 # special chars to mark beginning and end of raw segment text
 BEGIN_CHAR = "\uFEFF"
@@ -35,12 +40,21 @@ class Annotator(GraphicalUserInterface):
     """
     Class managing the annotation process
     """
-    def __init__(self):
+    # symbols of the operators combining filters, by operator
+    filter_operators = {
+        "and": "∧",
+        "or": "∨",
+        "and not": "∧ ¬"
+    }
+
+    def __init__(self, profiler=None):
         """
         Initializes the annotator
         """
         GraphicalUserInterface.__init__(self)
 
+        self.profiler = profiler or StartupProfiler()  # startup timing report
+
         ####################
         # CONTROL BINDINGS #
         ####################
@@ -113,6 +127,15 @@ class Annotator(GraphicalUserInterface):
         self.parent.bind(
             config.get_string("filter_by_active_qualifier", "<F7>"),
             lambda event: self.filter_by_active_qualifier())
+        self.parent.bind(
+            config.get_string("input_search_query", "<Control-F>"),
+            lambda event: self.input_search_query())
+        self.parent.bind(
+            config.get_string("go_to_next_hit", "<F8>"),
+            lambda event: self.go_to_hit())
+        self.parent.bind(
+            config.get_string("go_to_previous_hit", "<Shift-F8>"),
+            lambda event: self.go_to_hit(backward=True))
         self.parent.bind(
             config.get_string("undo", "<Control-z>"),
             lambda event: self.undo())
@@ -165,8 +188,9 @@ class Annotator(GraphicalUserInterface):
         self.file_menu.add_command(label=self._("menu.import_file"), accelerator="Ctrl+Shift+I", command=self.import_file)
         self.file_menu.add_command(label=self._("menu.export_file"), accelerator="Ctrl+Shift+E", command=self.export_file)
         self.file_menu.add_command(label=self._("menu.close_file"), accelerator="Ctrl+W", command=self.close_file)
+        self.file_menu.add_command(label=self._("menu.restore_backup"), command=self.restore_backup)
         self.file_menu.add_separator()
-        self.file_menu.add_command(label=self._("menu.parent"), accelerator="Esc", command=self.parent.quit)
+        self.file_menu.add_command(label=self._("menu.parent"), accelerator="Esc", command=self.exit_prompt)
 
         # edit menu
         self.edit_menu.add_command(label=self._("menu.undo"), accelerator="Ctrl+Z", command=self.undo)
@@ -187,6 +211,10 @@ class Annotator(GraphicalUserInterface):
         self.filter_menu.add_command(label=self._("menu.filter_by_active_layer"), accelerator="F5", command=self.filter_by_active_layer)
         self.filter_menu.add_command(label=self._("menu.filter_by_active_label"), accelerator="F6", command=self.filter_by_active_label)
         self.filter_menu.add_command(label=self._("menu.filter_by_active_qualifier"), accelerator="F7", command=self.filter_by_active_qualifier)
+        self.filter_menu.add_separator()
+        self.filter_menu.add_command(label=self._("menu.input_search_query"), accelerator="Ctrl+Shift+F", command=self.input_search_query)
+        self.filter_menu.add_command(label=self._("menu.go_to_next_hit"), accelerator="F8", command=self.go_to_hit)
+        self.filter_menu.add_command(label=self._("menu.go_to_previous_hit"), accelerator="Shift+F8", command=lambda: self.go_to_hit(backward=True))
 
         # taxonomy menu
         self.taxonomy_menu.add_command(label=self._("menu.import_taxonomy"), accelerator="Ctrl+Alt+I", command=self.import_taxonomy)
@@ -225,9 +253,21 @@ class Annotator(GraphicalUserInterface):
 
         # show legacy annotations
         self.show_legacy = True  # show legacy annotations by defaults
+
+        # text tags of the participants, by participant
+        self.participant_tags = {}
+
+        # last search query, whose hits are cycled through
+        self.search_query = None
   
         # init last backup time
         self.backup_time = 0
+        self.backup_store = BackupStore(SegmentCollection.backup_dir)  # incremental backups
+
+        # background autosave
+        self.autosave_worker = AutosaveWorker()
+        self.autosave_job = None  # pending autosave, collapsing bursts of edits
+        self.autosave_status = None  # autosave status displayed in the window title
 
         # show columns
         self.show_participant = config.get_bool("show_participant", True)  # show participant by default
@@ -235,35 +275,127 @@ class Annotator(GraphicalUserInterface):
         self.show_time = config.get_bool("show_time", True)  # show time by default
         self.show_id = config.get_bool("show_id", False)  # hide id by default
 
+        # initializing the segment collection, until the previous save is loaded
+        self.sc = SegmentCollection()
+
+        # the window is displayed before the previous save is loaded
+        self.update_status_message(self._("status.loading"))
+        self.after_idle(self.restore_session)
+
+        # autosave status display
+        self.poll_autosave()
+
+        self.profiler.mark("interface")
+
+    def restore_session(self):
+        """
+        Loads the previous save and displays it, its other segments are then decoded in the background
+        """
+        self.update_idletasks()  # draws the window
+
         # attempt to load previous save
         previous_save = SegmentCollection.read_save_path_from_tmp()
 
         if previous_save:
-            self.sc = SegmentCollection.load(previous_save)
+            sc = SegmentCollection.load(previous_save)
+
+            if sc:
+                self.sc = sc
 
-        if not hasattr(self, "sc") or not self.sc:
-            # initializing the segment collection
-            self.sc = SegmentCollection()  # load command
+        self.profiler.mark("load")
 
         # colorization
         self.colorize()
 
         # display update
         self.update()
+        self.update_idletasks()
+
+        self.profiler.mark("first screen")
+
+        self.decode_in_background(self.sc)
+
+    def decode_in_background(self, sc, start=0):
+        """
+        Decodes lazily loaded segments by batches, between interface events
+        """
+        # stops if another collection was opened
+        if sc is not self.sc:
+            return
+
+        end = start + config.get_int("decode_batch_size", 1000)
+
+        for segment in sc.full_collection[start:end]:
+            if isinstance(segment, LazySegment):
+                segment.materialize()
+
+        if end < len(sc.full_collection):
+            self.after(1, self.decode_in_background, sc, end)
+        else:
+            self.profiler.mark("background decoding")
+            self.profiler.report()
+
+    ####################
+    # AUTOSAVE METHODS #
+    ####################
+
+    def schedule_autosave(self):
+        """
+        Schedules an autosave, edits made before it runs are written together
+        """
+        if self.autosave_job is None and self.sc.is_modified():
+            self.autosave_job = self.after(config.get_int("autosave_delay", 1000), self.autosave)
+
+    def autosave(self):
+        """
+        Captures changes and hands them over to the autosave worker
+        """
+        if self.autosave_job is not None:
+            self.after_cancel(self.autosave_job)
+            self.autosave_job = None
+
+        try:
+            task = self.sc.prepare_save()
+        except Exception:
+            logging.exception("Annotator.autosave()")
+            return
+
+        if task:
+            self.autosave_worker.submit(task)
+
+        self.backup_save(interval=config.get_int("backup_frequency", 600))  # autobackup
 
     def backup_save(self, interval=600):
         """
-        If enough time has passed, backs up save file
+        If enough time has passed and the collection changed, backs up the segments changed since the last backup
         """
         current_time = time()
 
-        if self.backup_time + interval < current_time:
-            self.sc.save(
-                path="{}/auto-{}.pic".format(SegmentCollection.backup_dir, datetime.now().strftime("%d-%m-%y_%X")),
-                backup=True
-            )
+        if self.backup_time + interval < current_time and self.sc.is_modified(backup=True):
+            task = self.sc.prepare_backup(self.backup_store)
+
+            if task:
+                self.autosave_worker.submit(task)
+
+            self.backup_time = current_time  # updates last backup time
 
-        self.backup_time = current_time  # updates last backup time
+    def poll_autosave(self):
+        """
+        Displays the autosave worker's status in the window title
+        """
+        if self.autosave_worker.status != self.autosave_status:
+            self.autosave_status = self.autosave_worker.status
+            self.update_title()
+
+        self.after(200, self.poll_autosave)
+
+    def manage_exit(self):
+        """
+        Saves the cursor position and active layer, then waits for the last write before exiting
+        """
+        self.sc.touch()
+        self.autosave()
+        self.autosave_worker.stop()
 
     ################
     # VIEW METHODS #
@@ -323,24 +455,28 @@ class Annotator(GraphicalUserInterface):
         """
         Adds a color tag per participant to the text widget
         """
-        for participant in set([s.participant for s in self.sc.full_collection]):
+        for participant in self.sc.get_participants():
             self.add_tag(
-                "participant-{}".format(participant),
+                self.get_participant_tag(participant),
                 foreground=generate_random_color()
             )
 
-    def generate_layer_colors(self):
+    def get_participant_tag(self, participant):
         """
-        Adds a color tag per layer to the text widget
+        Returns the text tag of a participant, formatted once
         """
-        legacy_layers = []
+        tag = self.participant_tags.get(participant)
 
-        for segment in self.sc.full_collection:
-            for layer in segment.legacy.keys():
-                if layer not in legacy_layers:
-                    legacy_layers.append(layer)
+        if tag is None:
+            tag = self.participant_tags[participant] = "participant-{}".format(participant)
+
+        return tag
 
-        for layer in list(self.sc.labels.keys()) + legacy_layers:
+    def generate_layer_colors(self):
+        """
+        Adds a color tag per layer to the text widget
+        """
+        for layer in list(self.sc.labels.keys()) + self.sc.get_legacy_layers():
             if layer not in self.sc.colors.keys():
                 self.sc.colors[layer] = generate_random_color()
 
@@ -401,12 +537,14 @@ class Annotator(GraphicalUserInterface):
 
     def open_file(self):
         """
-        Loads a .pic file through dialogue
+        Loads a .dia, .db or .pic file through dialogue
         """
         path = filedialog.askopenfilename(
             initialdir=SegmentCollection.save_dir,
             title=self._("dialog.title.open_file"),
             filetypes=(
+                (self._("filetype.dia"), "*.dia"),
+                (self._("filetype.database"), "*.db"),
                 (self._("filetype.pickle"), "*.pic"),
                 (self._("filetype.all_files"), "*.*")
             )
@@ -415,10 +553,13 @@ class Annotator(GraphicalUserInterface):
         if not path:
             return  # no file selected
 
+        # pending changes are written before another file is read
+        self.autosave()
+        self.autosave_worker.wait()
+
         sc = SegmentCollection.load(path)
 
         if sc:
-            print(3)
             self.sc = sc
             stack().clear()  # reinitializes undo history
             self.colorize()
@@ -426,8 +567,6 @@ class Annotator(GraphicalUserInterface):
 
             return True
 
-        print(4)
-
         messagebox.showerror(
             self._("error.title.open_file"),
             self._("error.text.open_file")
@@ -437,12 +576,14 @@ class Annotator(GraphicalUserInterface):
 
     def save_file(self):
         """
-        Saves a .pic file through dialogue
+        Saves a .dia, .db or .pic file through dialogue
         """
         path = filedialog.asksaveasfilename(
             initialdir=SegmentCollection.save_dir,
             title=self._("dialog.title.save_file"),
             filetypes=(
+                (self._("filetype.dia"), "*.dia"),
+                (self._("filetype.database"), "*.db"),
                 (self._("filetype.pickle"), "*.pic"),
                 (self._("filetype.all_files"), "*.*")
             )
@@ -451,6 +592,8 @@ class Annotator(GraphicalUserInterface):
         if not path:
             return  # no path selected
 
+        self.autosave_worker.wait()
+
         success = self.sc.save(path=path)
 
         if not success:
@@ -480,6 +623,10 @@ class Annotator(GraphicalUserInterface):
         if not path:
             return  # no file selected
 
+        # pending changes are written before the collection is replaced
+        self.autosave()
+        self.autosave_worker.wait()
+
         success = self.sc.import_collection(path)
 
         if success:
@@ -543,12 +690,53 @@ class Annotator(GraphicalUserInterface):
         """
         Closes the current file
         """
+        # pending changes are written before the file is closed
+        self.autosave()
+        self.autosave_worker.wait()
+
         # deletes the "previous save" file
         SegmentCollection.delete_save_path_on_tmp()
         self.clear_screen()
         self.sc = SegmentCollection()  # load command
         self.update()
 
+    def restore_backup(self):
+        """
+        Restores a backup point through dialogue
+        """
+        path = filedialog.askopenfilename(
+            initialdir=SegmentCollection.backup_dir,
+            title=self._("dialog.title.restore_backup"),
+            filetypes=(
+                (self._("filetype.backup"), "*{}".format(BackupStore.extension)),
+                (self._("filetype.all_files"), "*.*")
+            )
+        )
+
+        if not path:
+            return  # no file selected
+
+        # pending changes are written before the backup replaces them
+        self.autosave()
+        self.autosave_worker.wait()
+
+        sc = SegmentCollection.restore_backup(path)
+
+        if sc:
+            self.sc = sc
+            stack().clear()  # reinitializes undo history
+            self.colorize()
+            self.update()
+
+            return True
+
+        messagebox.showerror(
+            self._("error.title.restore_backup"),
+            self._("error.text.restore_backup")
+        )
+
+        return False
+
     def import_taxonomy(self):
         """
         Loads a .json taxonomy file through dialogue
@@ -683,10 +871,7 @@ class Annotator(GraphicalUserInterface):
         """
         i = self.sc.i
 
-        if number > self.sc.i:
-            self.sc.next(number - self.sc.i)
-        else:
-            self.sc.previous(self.sc.i - number)
+        self.sc.go_to(number)
 
         self.update()
 
@@ -713,6 +898,11 @@ class Annotator(GraphicalUserInterface):
         segment = self.sc.get_active()
         i, fi = self.sc.get_segment_indexes(segment)
         self.sc.remove(segment)
+
+        # the cursor moves to the segment that followed
+        if self.sc.collection:
+            self.sc.go_to(self.sc.locate(fi))
+
         self.update()
 
         yield "apply_delete_segment"
@@ -734,25 +924,16 @@ class Annotator(GraphicalUserInterface):
         """
         Applies a merge
         """
-        i, fi = self.sc.get_segment_indexes(segment)
-
-        original = segment.copy(segment.raw)
-        segment.merge(previous)
+        state = self.sc.merge_segments(segment, previous)
 
-        self.sc.remove(previous)
-        self.sc.previous()
+        self.sc.go_to(self.sc.locate_segment(segment))
 
         self.update()
 
         yield "apply_merge_segment"
 
-        self.sc.remove(segment)
-
-        segment.copy(original)
-
         # insert splits back
-        self.sc.insert(i - 1, fi - 1, segment)
-        self.sc.insert(i - 1, fi - 1, previous)
+        self.sc.unmerge_segments(segment, previous, state)
 
         # cycle to next
         self.sc.next()
@@ -800,8 +981,8 @@ class Annotator(GraphicalUserInterface):
                 # remove original segment
                 self.sc.remove(selected_segment)
 
-                # moving index
-                self.sc.next(n=len(splits) - 1)
+                # the cursor stays on the active segment, or moves to the last split if the active segment was split
+                self.sc.go_to(self.sc.locate_segment(splits[-1] if selected_segment is active_segment else active_segment))
         else:
             # the annotation is applied to the active segment
             segment = active_segment
@@ -824,7 +1005,7 @@ class Annotator(GraphicalUserInterface):
             self.sc.insert(i, fi, split)
 
         self.sc.remove(segment)
-        self.sc.next()
+        self.sc.go_to(self.sc.locate_segment(splits[-1]))
 
         self.update()
 
@@ -859,6 +1040,7 @@ class Annotator(GraphicalUserInterface):
 
         segment.rem(self.sc.layer)
         segment.rem(self.sc.layer, qualifier=True)
+        self.sc.touch(segment)
 
         self.update()
 
@@ -866,6 +1048,7 @@ class Annotator(GraphicalUserInterface):
 
         segment.set(self.sc.layer, label)
         segment.set(self.sc.layer, qualifier, qualifier=True)
+        self.sc.touch(segment)
 
     def select_link_type(self):
         """
@@ -909,6 +1092,7 @@ class Annotator(GraphicalUserInterface):
             if not (self.sc.collection[number], link_type) in segment.links:
                 segment.links.append((self.sc.collection[number], link_type))
                 self.sc.collection[number].linked.append((segment, link_type))
+                self.sc.touch(segment)
 
                 success = True
 
@@ -919,6 +1103,7 @@ class Annotator(GraphicalUserInterface):
         if success:
             segment.links.remove((self.sc.collection[number], link_type))
             self.sc.collection[number].linked.remove((segment, link_type))
+            self.sc.touch(segment)
 
     @undoable
     def unlink_segment(self):
@@ -932,6 +1117,7 @@ class Annotator(GraphicalUserInterface):
             ls, lt = segment.links[0]
             segment.remove_links(ls)
 
+        self.sc.touch(segment)
         self.update()
 
         yield "unlink_segment"
@@ -939,6 +1125,8 @@ class Annotator(GraphicalUserInterface):
         for ls, lt in links:
             segment.create_link(ls, lt)
 
+        self.sc.touch(segment)
+
     def input_new_note(self):
         """
         Inputs a note for the active segment
@@ -961,11 +1149,13 @@ class Annotator(GraphicalUserInterface):
         else:
             segment.note = None
 
+        self.sc.touch(segment)
         self.update()
 
         yield "set_note"
 
         segment.note = previous_note
+        self.sc.touch(segment)
 
     ################################
     # TAXONOMY MANAGEMENT COMMANDS #
@@ -1095,6 +1285,7 @@ class Annotator(GraphicalUserInterface):
         Removes the active segment's layer from the taxonomy
         """
         self.sc.default_layer = self.sc.layer
+        self.sc.touch()
 
     def remove_layer(self):
         """
@@ -1180,12 +1371,7 @@ class Annotator(GraphicalUserInterface):
             self.input("prompt.select_element_to_colorize_layer", self.sc.labels.keys(), self.pick_color_for_layer)
 
         if element_type == self._("legacy_layer"):
-            legacy_layers = []
-
-            for segment in self.sc.full_collection:
-                for layer in segment.legacy.keys():
-                    if layer not in legacy_layers and layer not in self.sc.labels.keys():
-                        legacy_layers.append(layer)
+            legacy_layers = [layer for layer in self.sc.get_legacy_layers() if layer not in self.sc.labels.keys()]
 
             self.input("prompt.select_element_to_colorize_legacy_layer", legacy_layers, self.pick_color_for_layer)
 
@@ -1210,6 +1396,7 @@ class Annotator(GraphicalUserInterface):
 
         if len(color) > 0 and color[-1]:
             self.sc.colors[layer] = color[-1]
+            self.sc.touch()
             self.generate_layer_colors()
             self.update()
 
@@ -1221,6 +1408,7 @@ class Annotator(GraphicalUserInterface):
 
         if len(color) > 0 and color[-1]:
             self.sc.links[link_type] = color[-1]
+            self.sc.touch()
             self.generate_link_colors()
             self.update()
 
@@ -1369,11 +1557,11 @@ class Annotator(GraphicalUserInterface):
     # VIEW COMMANDS #
     #################
 
-    def select_filter_type(self):
+    def select_filter_type(self, operator=None):
         """
-        Selects a filter type
+        Selects a filter type, the new filter being combined with the active one by an operator if any
         """
-        if not self.sc.filter:
+        if not self.sc.filter or operator is not None:
             self.input(
                 self._("prompt.select_filter_type"), [
                     self._("layer"),
@@ -1381,11 +1569,29 @@ class Annotator(GraphicalUserInterface):
                     self._("label"),
                     self._("legacy_label"),
                     self._("qualifier"),
-                    self._("legacy_qualifier")
-                ], self.filter)
+                    self._("legacy_qualifier"),
+                    self._("text")
+                ], lambda filter_type: self.filter(filter_type, operator))
         else:
+            self.input(
+                self._("prompt.select_filter_operator"), [
+                    self._("filter_and"),
+                    self._("filter_or"),
+                    self._("filter_and_not"),
+                    self._("remove_filter")
+                ], self.select_filter_operator)
+
+    def select_filter_operator(self, choice):
+        """
+        Removes the active filter, or selects the operator combining it with a new filter
+        """
+        if choice == self._("remove_filter"):
             self.remove_filter()
 
+        for operator in self.filter_operators:
+            if choice == self._("filter_{}".format(operator.replace(" ", "_"))):
+                self.select_filter_type(operator)
+
     @undoable
     def remove_filter(self):
         """
@@ -1393,14 +1599,13 @@ class Annotator(GraphicalUserInterface):
         """
         sc = deepcopy(self.sc)
 
-        if self.sc.collection:
-            i = self.sc.full_collection.index(self.sc.get_active())
-        else:
-            i = self.sc.i
+        active = self.sc.get_active() if self.sc.collection else None
 
         self.sc.collection = self.sc.full_collection.copy()
         self.sc.filter = False
-        self.go_to(i)
+
+        if active is not None:
+            self.go_to(self.sc.locate_segment(active))
 
         self.update()
 
@@ -1408,28 +1613,22 @@ class Annotator(GraphicalUserInterface):
 
         self.sc = sc
 
-    def filter(self, filter_type):
+    def filter(self, filter_type, operator=None):
         """
-        Filters the collection
+        Filters the collection, combining the new filter with the active one by an operator if any
         """
         if filter_type == self._("layer"):
             self.input(
                 "prompt.filter_layer",
                 self.sc.labels.keys(),
-                self.filter_by_layer
+                lambda value: self.filter_by_layer(value, operator)
             )
 
         if filter_type == self._("legacy_layer"):
-            legacy_layers = []
-
-            for segment in self.sc.full_collection:
-                for layer in segment.legacy.keys():
-                    legacy_layers.append(layer)
-
-            self.input(
+            self.input_from_vocabulary(
                 "prompt.filter_legacy_layer",
-                set(legacy_layers),
-                self.filter_by_legacy_layer
+                self.sc.get_vocabulary(PRESENCE, legacy=True),
+                lambda value: self.filter_by_legacy_layer(value, operator)
             )
 
         if filter_type == self._("label"):
@@ -1441,21 +1640,14 @@ class Annotator(GraphicalUserInterface):
             self.input(
                 "prompt.filter_label",
                 set(labels),
-                self.filter_by_label
+                lambda value: self.filter_by_label(value, operator)
             )
 
         if filter_type == self._("legacy_label"):
-            legacy_labels = []
-
-            for segment in self.sc.full_collection:
-                for layer in segment.legacy.keys():
-                    if segment.has(layer, legacy=True):
-                        legacy_labels.append(segment.get(layer, legacy=True))
-
-            self.input(
+            self.input_from_vocabulary(
                 "prompt.filter_legacy_label",
-                set(legacy_labels),
-                self.filter_by_legacy_label
+                self.sc.get_vocabulary(legacy=True),
+                lambda value: self.filter_by_legacy_label(value, operator)
             )
 
         if filter_type == self._("qualifier"):
@@ -1467,23 +1659,28 @@ class Annotator(GraphicalUserInterface):
             self.input(
                 "prompt.filter_qualifier",
                 set(qualifiers),
-                self.filter_by_qualifier
+                lambda value: self.filter_by_qualifier(value, operator)
             )
 
         if filter_type == self._("legacy_qualifier"):
-            legacy_qualifiers = []
-
-            for segment in self.sc.full_collection:
-                for layer in segment.legacy.keys():
-                    if segment.has(layer, legacy=True, qualifier=True):
-                        legacy_qualifiers.append(segment.get(layer, legacy=True, qualifier=True))
-
-            self.input(
+            self.input_from_vocabulary(
                 "prompt.filter_legacy_qualifier",
-                set(legacy_qualifiers),
-                self.filter_by_legacy_qualifier
+                self.sc.get_vocabulary("qualifier", legacy=True),
+                lambda value: self.filter_by_legacy_qualifier(value, operator)
             )
 
+        if filter_type == self._("text"):
+            placeholder = "" if self.search_query is None else self.search_query
+            self.input("prompt.filter_text", [], lambda query: self.filter_by_text(query, operator), placeholder=placeholder, free=True)
+
+    def input_from_vocabulary(self, prompt, vocabulary, action):
+        """
+        Prompts for a value of a vocabulary, each option showing the number of segments with the value
+        """
+        options = OrderedDict(("{} ({})".format(value, count), value) for value, count in vocabulary.items())
+
+        self.input(prompt, options.keys(), lambda option: action(options.get(option, option)))
+
     def filter_by_active_layer(self):
         """
         Filters the collection by active layer
@@ -1517,140 +1714,153 @@ class Annotator(GraphicalUserInterface):
         else:
             self.remove_filter()
 
-    def finish_filter(self):
+    def compose_filter(self, description, operator):
         """
-        Moves the index to an appropriate location in the new collection
+        Returns the description of a filter, combined with the description of the active filter by an operator if any
         """
-        # look first for a target from the active segment to the end, and then backwards from the position of the active segment
-        for i in list(range(self.sc.i, len(self.sc.full_collection))) + list(reversed(range(0, self.sc.i))):
-            segment = self.sc.full_collection[i]
+        if operator is None:
+            return description
+
+        return "{} {} {}".format(self.sc.filter, self.filter_operators[operator], description)
+
+    def apply_filter(self, bitmap, description, operator):
+        """
+        Filters the collection by a bitmap of segments, combined with the active filter by an operator if any
+        """
+        active = self.sc.get_active() if self.sc.collection else None
+
+        self.sc.compose_view(bitmap, operator)
+        self.sc.filter = self.compose_filter(description, operator)
 
-            if segment in self.sc.collection:
-                # adjust the current index in the new collection
-                index = self.sc.collection.index(segment)
-                self.go_to(index)
-                break
+        self.finish_filter(active)
+
+    def finish_filter(self, active):
+        """
+        Moves the index to the previously active segment in the new collection, or to the nearest segment following it,
+        or preceding it if none follows
+        """
+        if active is not None and self.sc.collection:
+            self.go_to(self.sc.locate_segment(active))
 
         self.update()
 
     @undoable
-    def filter_by_layer(self, layer):
+    def filter_by_layer(self, layer, operator=None):
         """
         Filters the collection by layer
         """
         sc = deepcopy(self.sc)
 
-        self.sc.collection = [s for s in self.sc.full_collection if layer in s.annotations]
-        self.sc.filter = "|{}|".format(layer)
-        self.finish_filter()
+        self.apply_filter(self.sc.select_segments_with_layer(layer), "|{}|".format(layer), operator)
 
         yield "filter_by_layer"
 
         self.sc = sc
 
     @undoable
-    def filter_by_legacy_layer(self, layer):
+    def filter_by_legacy_layer(self, layer, operator=None):
         """
         Filters the collection by legacy layer
         """
         sc = deepcopy(self.sc)
 
-        self.sc.collection = [s for s in self.sc.full_collection if layer in s.legacy]
-        self.sc.filter = "|{}|".format(layer)
-        self.finish_filter()
+        self.apply_filter(self.sc.select_segments_with_layer(layer, legacy=True), "|{}|".format(layer), operator)
 
         yield "filter_by_legacy_layer"
 
         self.sc = sc
 
     @undoable
-    def filter_by_label(self, label):
+    def filter_by_label(self, label, operator=None):
         """
         Filters the collection by label
         """
         sc = deepcopy(self.sc)
 
-        segments = []
-
-        for segment in self.sc.full_collection:
-            for layer in segment.annotations:
-                if segment.has(layer, annotation=label):
-                    segments.append(segment)
-
-        self.sc.collection = segments
-        self.sc.filter = "[{}]".format(label)
-        self.finish_filter()
+        self.apply_filter(self.sc.select_segments(annotation=label), "[{}]".format(label), operator)
 
         yield "filter_by_label"
 
         self.sc = sc
 
     @undoable
-    def filter_by_legacy_label(self, label):
+    def filter_by_legacy_label(self, label, operator=None):
         """
         Filters the collection by legacy label
         """
         sc = deepcopy(self.sc)
 
-        segments = []
-
-        for segment in self.sc.full_collection:
-            for layer in segment.legacy:
-                if segment.has(layer, annotation=label, legacy=True):
-                    segments.append(segment)
-
-        self.sc.collection = segments
-        self.sc.filter = "[{}]".format(label)
-        self.finish_filter()
+        self.apply_filter(self.sc.select_segments(annotation=label, legacy=True), "[{}]".format(label), operator)
 
         yield "filter_by_legacy_label"
 
         self.sc = sc
 
     @undoable
-    def filter_by_qualifier(self, qualifier):
+    def filter_by_qualifier(self, qualifier, operator=None):
         """
         Filters the collection by qualifier
         """
         sc = deepcopy(self.sc)
 
-        segments = []
-
-        for segment in self.sc.full_collection:
-            for layer in segment.annotations:
-                if segment.has(layer, annotation=qualifier, qualifier=True):
-                    segments.append(segment)
-
-        self.sc.collection = segments
-        self.sc.filter = "[➔ {}]".format(qualifier)
-        self.finish_filter()
+        self.apply_filter(self.sc.select_segments(annotation=qualifier, qualifier=True), "[➔ {}]".format(qualifier), operator)
 
         yield "filter_by_qualifier"
 
         self.sc = sc
 
     @undoable
-    def filter_by_legacy_qualifier(self, qualifier):
+    def filter_by_legacy_qualifier(self, qualifier, operator=None):
         """
         Filters the collection by legacy qualifier
         """
         sc = deepcopy(self.sc)
 
-        segments = []
+        self.apply_filter(self.sc.select_segments(annotation=qualifier, qualifier=True, legacy=True), "((➔ {}))".format(qualifier), operator)
 
-        for segment in self.sc.full_collection:
-            for layer in segment.legacy:
-                if segment.has(layer, annotation=qualifier, qualifier=True, legacy=True):
-                    segments.append(segment)
+        yield "filter_by_legacy_qualifier"
 
-        self.sc.collection = segments
-        self.sc.filter = "((➔ {}))".format(qualifier)
-        self.finish_filter()
+        self.sc = sc
 
-        yield "filter_by_legacy_qualifier"
+    @undoable
+    def filter_by_text(self, query, operator=None):
+        """
+        Filters the collection by segments matching a search query
+        """
+        sc = deepcopy(self.sc)
+
+        self.search_query = query
+        self.apply_filter(self.sc.select_text(query), "\"{}\"".format(query), operator)
+
+        yield "filter_by_text"
 
         self.sc = sc
 
+    def input_search_query(self):
+        """
+        Inputs a search query, then moves to its first hit after the active segment
+        """
+        placeholder = "" if self.search_query is None else self.search_query
+        self.input("prompt.input_search_query", [], self.search, placeholder=placeholder, free=True)
+
+    def search(self, query):
+        """
+        Sets the search query, then moves to its first hit after the active segment
+        """
+        self.search_query = query
+
+        self.go_to_hit()
+
+    def go_to_hit(self, backward=False):
+        """
+        Moves to the next hit of the search query, or to the previous one if backward
+        """
+        if self.search_query and self.sc.collection:
+            i = self.sc.find_hit(self.search_query, backward)
+
+            if i is not None:
+                self.go_to(i)
+
     ######################
     # UNDO/REDO COMMANDS #
     ######################
@@ -1698,11 +1908,13 @@ class Annotator(GraphicalUserInterface):
         previous_layer = self.sc.layer
 
         self.sc.layer = layer
+        self.sc.touch()
         self.update()
 
         yield "set_active_layer"
 
         self.sc.layer = previous_layer
+        self.sc.touch()
 
     ############################
     # MOUSE MANAGEMENT METHODS #
@@ -1883,6 +2095,7 @@ class Annotator(GraphicalUserInterface):
 
         original_annotation = segment.get(self.sc.layer, qualifier=qualifier)  # get annotation
         segment.set(self.sc.layer, annotation, qualifier=qualifier)  # set annotation
+        self.sc.touch(segment)
 
         if segment == self.sc.get_active() and not(segment == self.sc.get_active() and not segment.has(self.sc.layer, qualifier=True) and self.sc.layer in self.sc.qualifiers.keys()):
             # moving index
@@ -1897,6 +2110,8 @@ class Annotator(GraphicalUserInterface):
             # remove annotation
             segment.rem(self.sc.layer, qualifier=qualifier)
 
+        self.sc.touch(segment)
+
         # moving index back
         self.go_to(start_i)
 
@@ -1913,7 +2128,7 @@ class Annotator(GraphicalUserInterface):
         # if the collection is not empty
         if self.sc.collection:
             # default title
-            self.parent.title("{} - {}".format(self.window_title, self.sc.save_file))
+            self.update_title()
 
             first, last = self.sc.display_range
 
@@ -1957,7 +2172,7 @@ class Annotator(GraphicalUserInterface):
                 )
         else:
             # default title
-            self.parent.title(self.window_title)
+            self.update_title()
 
             # status message
             status = "No Collection"
@@ -1971,8 +2186,22 @@ class Annotator(GraphicalUserInterface):
         self.annotation_mode()
         self.is_annotation_mode = True
 
-        self.sc.save()  # autosave
-        self.backup_save(interval=config.get_int("backup_frequency", 600))  # autobackup
+        self.schedule_autosave()  # autosave, only writes if the collection changed
+
+    def update_title(self):
+        """
+        Updates the window title with the save file and autosave status
+        """
+        if not self.sc.collection:
+            self.parent.title(self.window_title)
+            return
+
+        title = "{} - {}".format(self.window_title, self.sc.save_file)
+
+        if self.autosave_status is not None:
+            title = "{} ({})".format(title, self._("autosave.{}".format(self.autosave_status)))
+
+        self.parent.title(title)
 
     def output_segment(self, i, active=False):
         """
@@ -1981,7 +2210,7 @@ class Annotator(GraphicalUserInterface):
         segment = self.sc.collection[i]
 
         # participant color
-        style = ["participant-{}".format(segment.participant)]
+        style = [self.get_participant_tag(segment.participant)]
 
         # columns to be displayed
         columns = [str(i + 1)]  # the index is the first column
@@ -1989,9 +2218,9 @@ class Annotator(GraphicalUserInterface):
         if self.show_id:
             columns.append(str(segment.id))
         if self.show_date:
-            columns.append(segment.datetime.strftime("%d-%m-%y"))
+            columns.append(segment.format_datetime("%d-%m-%y", DAY))
         if self.show_time:
-            columns.append(segment.datetime.strftime("%H:%M"))
+            columns.append(segment.format_datetime("%H:%M", MINUTE))
         if self.show_participant:
             columns.append(segment.participant)
 
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Background autosave
+"""
+
+import logging
+
+from queue import Queue
+from threading import Thread
+
+
+class AutosaveWorker(Thread):
+    """
+    Thread running save tasks in submission order, away from the interface
+    """
+    SAVING = "saving"
+    SAVED = "saved"
+    FAILED = "failed"
+
+    def __init__(self):
+        """
+        Initializes and starts the worker
+        """
+        Thread.__init__(self, daemon=True)
+
+        self.tasks = Queue()  # pending save tasks, None stops the worker
+        self.status = None  # status of the last task
+
+        self.start()
+
+    def run(self):
+        """
+        Runs save tasks until stopped
+        """
+        while True:
+            task = self.tasks.get()
+
+            if task is None:
+                self.tasks.task_done()
+                break
+
+            try:
+                task()
+
+                self.status = AutosaveWorker.SAVED if self.tasks.empty() else AutosaveWorker.SAVING
+            except Exception:
+                logging.exception("AutosaveWorker.run()")
+                self.status = AutosaveWorker.FAILED
+
+            self.tasks.task_done()
+
+    def submit(self, task):
+        """
+        Queues a save task
+        """
+        self.status = AutosaveWorker.SAVING
+        self.tasks.put(task)
+
+    def wait(self):
+        """
+        Blocks until all queued tasks are written
+        """
+        self.tasks.join()
+
+    def stop(self):
+        """
+        Writes the remaining tasks and stops the worker
+        """
+        self.tasks.put(None)
+        self.join()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Content-addressed backups
+
+Segments are grouped in chunks, stored once under the hash of their content and shared between backups.
+A backup point is a small manifest listing the hashes of its chunks, which are compressed with the configured codec:
+
+    auto-<date>.bak
+    objects/<2 first characters of the hash>/<hash>.json
+"""
+
+import codecs
+import compression
+import hashlib
+import json
+import os
+import zlib
+
+from datetime import datetime, timedelta
+
+from config import ConfigFile
+
+config = ConfigFile()  # INI configuration file
+
+
+class BackupStore:
+    """
+    Directory of backup points, only storing the chunks of segments changed since the previous backups
+    """
+    extension = ".bak"  # backup point manifests
+    prefix = "auto-"  # backup point names
+    date_format = "%Y-%m-%d_%H-%M-%S"  # backup point dates, sortable
+
+    chunk_size = 64  # average number of segments per chunk
+
+    hourly = config.get_int("backup_hourly", 24)  # number of hours during which one backup per hour is kept
+    daily = config.get_int("backup_daily", 30)  # number of days during which one backup per day is kept
+
+    def __init__(self, path):
+        """
+        Initializes the store of a backup directory
+        """
+        self.path = path
+        self.objects_path = os.path.join(path, "objects")
+        self.chunks = {}  # (segments, generations, hash) of the chunks of the last backup, by segment object ids
+
+    @staticmethod
+    def split(segments):
+        """
+        Splits segments into chunks, whose boundaries depend on segment ids so that insertions and removals only change one chunk
+        """
+        chunks = []
+        chunk = []
+
+        for segment in segments:
+            chunk.append(segment)
+
+            if zlib.crc32(str(segment.id).encode("utf-8")) % BackupStore.chunk_size == 0:
+                chunks.append(tuple(chunk))
+                chunk = []
+
+        if chunk:
+            chunks.append(tuple(chunk))
+
+        return chunks
+
+    def prepare(self, segments, header):
+        """
+        Captures the chunks changed since the last backup and returns a task writing a new backup point
+        """
+        blobs = {}  # new chunks, by hash
+        hashes = []
+        chunks = {}
+
+        for chunk in BackupStore.split(segments):
+            key = tuple(id(segment) for segment in chunk)
+            generations = tuple(segment.generation for segment in chunk)
+
+            cached = self.chunks.get(key)
+
+            # unchanged chunks are not serialized again
+            if cached is not None and cached[1] == generations:
+                digest = cached[2]
+            else:
+                data = json.dumps([segment.to_record() for segment in chunk], ensure_ascii=False).encode("utf-8")
+                digest = hashlib.sha1(data).hexdigest()
+                blobs[digest] = data
+
+            hashes.append(digest)
+            chunks[key] = (chunk, generations, digest)
+
+        # the cache holds references to the segments, so that their object ids are not reused
+        self.chunks = chunks
+
+        manifest = dict(header)
+        manifest["created"] = datetime.now().strftime(BackupStore.date_format)
+        manifest["chunks"] = hashes
+
+        def write():
+            for digest, data in blobs.items():
+                path = self.object_path(digest)
+
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+                    with compression.open_write(path + ".part", "wb", compression.default_codec()) as f:
+                        f.write(data)
+
+                    os.replace(path + ".part", path)
+
+            path = os.path.join(self.path, "{}{}{}".format(BackupStore.prefix, manifest["created"], BackupStore.extension))
+
+            with codecs.open(path + ".part", "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+            os.replace(path + ".part", path)
+
+            self.prune()
+
+        return write
+
+    def object_path(self, digest):
+        """
+        Returns the path of a chunk
+        """
+        return os.path.join(self.objects_path, digest[:2], "{}.json".format(digest))
+
+    @staticmethod
+    def read(path):
+        """
+        Returns the manifest of a backup point and the records of its segments
+        """
+        with codecs.open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        store = BackupStore(os.path.dirname(path))
+        records = []
+
+        for digest in manifest["chunks"]:
+            with compression.open_read(store.object_path(digest), "rt", encoding="utf-8") as f:
+                records.extend(json.load(f))
+
+        return manifest, records
+
+    def points(self):
+        """
+        Returns the backup points, as (date, path) tuples from the newest to the oldest
+        """
+        points = []
+
+        if not os.path.isdir(self.path):
+            return points
+
+        for name in os.listdir(self.path):
+            if name.startswith(BackupStore.prefix) and name.endswith(BackupStore.extension):
+                try:
+                    created = datetime.strptime(name[len(BackupStore.prefix):-len(BackupStore.extension)], BackupStore.date_format)
+                except ValueError:
+                    continue  # not a backup point
+
+                points.append((created, os.path.join(self.path, name)))
+
+        return sorted(points, reverse=True)
+
+    def prune(self, now=None):
+        """
+        Deletes the backup points outside of the retention policy, then the chunks they alone used
+        """
+        now = now or datetime.now()
+
+        buckets = set()
+        kept = []
+
+        for n, (created, path) in enumerate(self.points()):
+            age = now - created
+
+            # the newest backup of each hour, then of each day, is kept
+            if age < timedelta(hours=BackupStore.hourly):
+                bucket = created.strftime("%Y-%m-%d_%H")
+            elif age < timedelta(days=BackupStore.daily):
+                bucket = created.strftime("%Y-%m-%d")
+            else:
+                bucket = None
+
+            # the latest backup is always kept
+            if n == 0 or (bucket is not None and bucket not in buckets):
+                buckets.add(bucket)
+                kept.append(path)
+            else:
+                os.remove(path)
+
+        # chunks that are not used by any remaining backup point are deleted
+        used = set()
+
+        for path in kept:
+            with codecs.open(path, encoding="utf-8") as f:
+                used.update(json.load(f)["chunks"])
+
+        if not os.path.isdir(self.objects_path):
+            return
+
+        for directory in os.listdir(self.objects_path):
+            for name in os.listdir(os.path.join(self.objects_path, directory)):
+                if name.endswith(".json") and name[:-len(".json")] not in used:
+                    os.remove(os.path.join(self.objects_path, directory, name))
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Benchmark suite
+
+Generates synthetic chat corpora shaped like the CSV samples, then measures the wall time, peak memory and output size
+of collection imports, exports, saves, loads and segment splits and merges, as well as the memory held per segment by
+imported collections. Results are printed as JSON lines, one per operation and corpus size:
+
+    python3 benchmark.py --sizes 1000 100000 --output results.jsonl
+"""
+
+import codecs
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+from model import SegmentCollection
+
+# words of the generated messages
+VOCABULARY = [
+    "bonsoir", "salut", "merci", "ubuntu", "installation", "partition", "windows", "grub", "noyau", "paquet",
+    "apt-get", "sudo", "installer", "lancer", "probleme", "erreur", "disque", "carte", "graphique", "pilote",
+    "wifi", "reseau", "fichier", "dossier", "terminal", "commande", "mise", "jour", "version", "depot",
+    "je", "tu", "il", "on", "ca", "marche", "pas", "plus", "avec", "sur", "dans", "pour", "que", "quoi", "comment",
+    "?", "!", ",", ".", ":)", "ok", "oui", "non", "essaye", "regarde"
+]
+
+LINK_TYPES = ["Feedback", "Functional", "Rhetoric"]  # link types of the generated taxonomy
+
+
+def generate_corpus(directory, size, participants=20, layers=8, link_density=0.1, seed=0):
+    """
+    Writes a synthetic corpus in CSV and JSON format, as well as its taxonomy, and returns their paths
+    """
+    rng = random.Random(seed)
+
+    names = ["user{}".format(n) for n in range(participants)]
+    layer_names = ["Layer {}".format(n) for n in range(layers)]
+    labels = {layer: ["label{}".format(n) for n in range(10)] for layer in layer_names}
+    qualifiers = {layer: ["qualifier{}".format(n) for n in range(3)] for layer in layer_names[::2]}
+
+    start = datetime(2014, 11, 1)
+    rows = []
+
+    n = 0
+    while n < size:
+        participant = rng.choice(names)
+        dt = (start + timedelta(seconds=20 * n)).strftime("%d-%m-%y %H:%M")
+
+        # some messages are made of two segments
+        spans = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 12))) for _ in range(rng.choice([1, 1, 1, 2]))]
+        spans = spans[:size - n]
+
+        for k, span in enumerate(spans):
+            row = {
+                "id": str(n),
+                "datetime": dt if k == 0 else "",
+                "participant": participant if k == 0 else "\\",
+                "segment": span,
+                "raw": " ".join(spans) if k == 0 else "",
+                "note": "",
+                "links": ""
+            }
+
+            for layer in layer_names:
+                label = rng.choice(labels[layer]) if rng.random() < 0.3 else ""
+
+                row[layer] = label
+
+                if layer in qualifiers:
+                    row["{}-value".format(layer)] = rng.choice(qualifiers[layer]) if label and rng.random() < 0.5 else ""
+
+            # links towards recent segments
+            if n > 0 and rng.random() < link_density:
+                row["links"] = "{}-{}".format(rng.randint(max(0, n - 20), n - 1), rng.choice(LINK_TYPES))
+
+            rows.append(row)
+            n += 1
+
+    fields = ["id", "datetime", "participant", "segment", "raw", "note", "links"] + [key for key in rows[0] if key.startswith("Layer")]
+
+    paths = {
+        "csv": os.path.join(directory, "corpus-{}.csv".format(size)),
+        "json": os.path.join(directory, "corpus-{}.json".format(size)),
+        "taxonomy": os.path.join(directory, "taxonomy.json")
+    }
+
+    with open(paths["csv"], "w") as f:
+        w = csv.DictWriter(f, fields, delimiter="\t", quoting=csv.QUOTE_NONE)
+        w.writeheader()
+        w.writerows(rows)
+
+    data = []
+    raw = None
+
+    for row in rows:
+        raw = row["raw"] or raw
+        links = {}
+
+        if row["links"]:
+            identifier, lt = row["links"].split("-")
+            links[lt] = [identifier]
+
+        data.append({
+            "id": row["id"],
+            "segment": row["segment"],
+            "raw": raw,
+            "participant": row["participant"] if row["participant"] != "\\" else data[-1]["participant"],
+            "datetime": row["datetime"] or data[-1]["datetime"],
+            "note": None,
+            "links": links,
+            "annotations": {
+                layer: dict([("label", row[layer])] + ([("qualifier", row["{}-value".format(layer)])] if row.get("{}-value".format(layer)) else []))
+                for layer in layer_names if row[layer]
+            }
+        })
+
+    with codecs.open(paths["json"], "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+
+    taxonomy = {
+        "name": "Benchmark",
+        "default": layer_names[0],
+        "colors": {layer: "#FFFFFF" for layer in layer_names},
+        "links": {lt: "#FFFFFF" for lt in LINK_TYPES},
+        "labels": labels,
+        "qualifiers": qualifiers
+    }
+
+    with codecs.open(paths["taxonomy"], "w", encoding="utf-8") as f:
+        json.dump(taxonomy, f, ensure_ascii=False)
+
+    return paths
+
+
+def measure(operation, memory=True):
+    """
+    Runs an operation and returns its wall time and peak memory, the latter being measured on a separate run
+    """
+    start = time.perf_counter()
+    operation()
+    seconds = time.perf_counter() - start
+
+    peak = None
+
+    # tracing allocations slows the operation down, so it is not timed
+    if memory:
+        tracemalloc.start()
+        operation()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return seconds, peak
+
+
+def split_and_merge(sc, count=100):
+    """
+    Splits segments spread over the collection in two, then merges their halves back, as the annotator does
+    """
+    for n in range(count):
+        segment = sc.full_collection[n * len(sc.full_collection) // count]
+
+        if len(segment.tokens) < 2:
+            continue
+
+        i, fi = sc.get_segment_indexes(segment)
+        splits = segment.split_on_token(segment.tokens[0])
+
+        for split in reversed(splits):
+            sc.insert(i, fi, split)
+
+        sc.remove(segment)
+
+        first, second = splits
+
+        second.merge(first)
+        sc.touch(second)
+        sc.remove(first)
+
+
+def resident(operation):
+    """
+    Runs an operation and returns the memory still held once it is done, by its result
+    """
+    tracemalloc.start()
+    result = operation()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del result
+
+    return current
+
+
+def run(size, directory, participants, layers, link_density, formats, memory):
+    """
+    Benchmarks every operation on a corpus of the given size, and returns the results
+    """
+    paths = generate_corpus(directory, size, participants, layers, link_density)
+
+    # the path of the last save, read at startup, is not overwritten
+    SegmentCollection.temp_dir = os.path.join(directory, "tmp/")
+
+    def imported(path):
+        sc = SegmentCollection()
+        sc.save_file = os.path.join(directory, "tmp.dia")
+
+        if not sc.import_collection(path):
+            raise Exception("import of {} failed".format(path))
+
+        sc.import_taxonomy(paths["taxonomy"])
+        sc.legacy_to_annotations()
+
+        return sc
+
+    sc = imported(paths["csv"])
+
+    operations = [
+        ("import_csv", lambda: imported(paths["csv"]), None),
+        ("import_json", lambda: imported(paths["json"]), None)
+    ]
+
+    for extension in ["csv", "json"]:
+        path = os.path.join(directory, "export-{}.{}".format(size, extension))
+        operations.append(("export_{}".format(extension), lambda path=path: sc.export_collection(path), path))
+
+    for extension in formats:
+        path = os.path.join(directory, "save-{}.{}".format(size, extension))
+
+        def save(path=path):
+            # a full save, rather than an autosave of the changes
+            sc.journal = sc.database = None
+
+            if not sc.save(path):
+                raise Exception("save to {} failed".format(path))
+
+        def load(path=path, full=False):
+            loaded = SegmentCollection.load(path)
+
+            if not loaded:
+                raise Exception("load of {} failed".format(path))
+
+            # lazily loaded segments are decoded
+            if full:
+                for segment in loaded.full_collection:
+                    segment.to_record()
+
+        operations.append(("save_{}".format(extension), save, path))
+        operations.append(("load_{}".format(extension), load, None))
+        operations.append(("load_{}_full".format(extension), lambda load=load: load(full=True), None))
+
+    # last, as it modifies the collection
+    operations.append(("split_merge", lambda: split_and_merge(sc), None))
+
+    results = []
+
+    for name, operation, output in operations:
+        seconds, peak = measure(operation, memory=memory)
+
+        # memory held by the segments of imported collections
+        held = resident(operation) if memory and name.startswith("import") else None
+
+        results.append({
+            "operation": name,
+            "segments": size,
+            "participants": participants,
+            "legacy_layers": layers,
+            "link_density": link_density,
+            "seconds": round(seconds, 6),
+            "peak_memory": peak,
+            "output_size": os.path.getsize(output) if output else None,
+            "resident_memory": held,
+            "bytes_per_segment": held // size if held is not None else None
+        })
+
+    return results
+
+
+def parse_args():
+    """
+    Parses command line options and arguments
+    """
+    ap = ArgumentParser(description="benchmarks collection imports, exports, saves and loads on synthetic corpora")
+
+    ap.add_argument(
+        "-s", "--sizes",
+        dest="sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="numbers of segments of the generated corpora")
+
+    ap.add_argument(
+        "-p", "--participants",
+        dest="participants",
+        type=int,
+        default=20,
+        help="number of participants")
+
+    ap.add_argument(
+        "-l", "--layers",
+        dest="layers",
+        type=int,
+        default=8,
+        help="number of legacy annotation layers")
+
+    ap.add_argument(
+        "-d", "--link-density",
+        dest="link_density",
+        type=float,
+        default=0.1,
+        help="proportion of segments linking to a previous segment")
+
+    ap.add_argument(
+        "-f", "--formats",
+        dest="formats",
+        nargs="+",
+        default=["dia", "db", "pic"],
+        help="save file formats, by extension")
+
+    ap.add_argument(
+        "-n", "--no-memory",
+        dest="memory",
+        default=True,
+        action="store_false",
+        help="does not measure peak memory, which requires running every operation twice")
+
+    ap.add_argument(
+        "-o", "--output",
+        dest="output",
+        default=None,
+        help="JSON lines file the results are appended to, instead of the standard output")
+
+    return ap.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_args()
+
+    environment = {
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform()
+    }
+
+    output = open(arguments.output, "a") if arguments.output else sys.stdout
+
+    with tempfile.TemporaryDirectory() as directory:
+        for size in arguments.sizes:
+            for result in run(size, directory, arguments.participants, arguments.layers, arguments.link_density, arguments.formats, arguments.memory):
+                result.update(environment)
+
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+                # progress, on the error output so that results can be piped
+                print("{:>16} {:>9} segments {:>10.3f}s".format(result["operation"], size, result["seconds"]), file=sys.stderr)
+
+    if output is not sys.stdout:
+        output.close()
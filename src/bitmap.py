@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Bitmaps
+
+Sets of rows, as the bits of an integer, combined with the integer's bitwise operators. Bits are packed and unpacked
+with NumPy when it is installed, and in Python otherwise.
+"""
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # bits are packed and unpacked in Python
+
+
+class Bitmap:
+    """
+    Set of rows, row n being bit n
+    """
+    __slots__ = ["bits"]
+
+    __hash__ = None  # compared by value, like sets
+
+    def __init__(self, bits=0):
+        """
+        Initializes the bitmap from an integer
+        """
+        self.bits = bits
+
+    @staticmethod
+    def from_rows(rows):
+        """
+        Returns the bitmap of rows
+        """
+        if numpy is not None:
+            rows = numpy.fromiter(rows, dtype="q")
+
+            if not len(rows):
+                return Bitmap()
+
+            mask = numpy.zeros(rows.max() + 1, dtype=bool)
+            mask[rows] = True
+
+            return Bitmap.from_mask(mask)
+
+        rows = list(rows)
+
+        if not rows:
+            return Bitmap()
+
+        data = bytearray((max(rows) >> 3) + 1)
+
+        for row in rows:
+            data[row >> 3] |= 1 << (row & 7)
+
+        return Bitmap(int.from_bytes(bytes(data), "little"))
+
+    @staticmethod
+    def from_mask(mask):
+        """
+        Returns the bitmap of the true values of a NumPy boolean array
+        """
+        return Bitmap(int.from_bytes(numpy.packbits(mask, bitorder="little").tobytes(), "little"))
+
+    def rows(self):
+        """
+        Returns the rows, in ascending order
+        """
+        data = self.bits.to_bytes((self.bits.bit_length() + 7) >> 3, "little")
+
+        if numpy is not None:
+            return numpy.flatnonzero(numpy.unpackbits(numpy.frombuffer(data, dtype="B"), bitorder="little")).tolist()
+
+        return [n << 3 | bit for n, byte in enumerate(data) if byte for bit in range(8) if byte >> bit & 1]
+
+    def __len__(self):
+        return bin(self.bits).count("1")
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __contains__(self, row):
+        return self.bits >> row & 1 == 1
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __eq__(self, other):
+        if isinstance(other, Bitmap):
+            return self.bits == other.bits
+
+        return NotImplemented
+
+    def __and__(self, other):
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other):
+        return Bitmap(self.bits | other.bits)
+
+    def __sub__(self, other):
+        return Bitmap(self.bits & ~other.bits)
+
+    def __repr__(self):
+        return "Bitmap({!r})".format(self.rows())
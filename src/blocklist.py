@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Block lists
+
+Lists split into blocks of bounded size, each item being mapped to its block and the sizes of the blocks being summed
+in a Fenwick tree, so that the position of an item is found in logarithmic time. Items must be hashable and unique.
+"""
+
+from itertools import chain, islice
+
+
+class Block(list):
+    """
+    Block of items, numbered by its position among the blocks
+    """
+    __slots__ = ["number"]
+
+
+class BlockList:
+    """
+    List of unique items, whose lookups, insertions and deletions take logarithmic time
+    """
+    block_size = 512  # number of items per block, blocks are split when they grow twice as large
+
+    __hash__ = None  # mutable, like lists
+
+    def __init__(self, items=()):
+        """
+        Initializes the list with items
+        """
+        items = list(items)
+
+        self.blocks = [Block(items[n:n + BlockList.block_size]) for n in range(0, len(items), BlockList.block_size)]
+        self.owners = {}  # block of each item
+        self.size = len(items)
+
+        for block in self.blocks:
+            for item in block:
+                self.owners[item] = block
+
+        if len(self.owners) != self.size:
+            raise ValueError("duplicate items in block list")
+
+        self.reindex()
+
+    ################
+    # TREE METHODS #
+    ################
+
+    def reindex(self):
+        """
+        Numbers the blocks and rebuilds the tree of their sizes, after blocks were added or removed
+        """
+        tree = [0] * (len(self.blocks) + 1)
+
+        for number, block in enumerate(self.blocks):
+            block.number = number
+            tree[number + 1] += len(block)
+
+            parent = (number + 1) + ((number + 1) & -(number + 1))
+
+            if parent < len(tree):
+                tree[parent] += tree[number + 1]
+
+        self.tree = tree
+
+    def resize(self, block, delta):
+        """
+        Updates the tree after items were added to or removed from a block
+        """
+        i = block.number + 1
+
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def offset(self, block):
+        """
+        Returns the number of items in the blocks preceding a block
+        """
+        total = 0
+        i = block.number
+
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+
+        return total
+
+    def locate(self, index):
+        """
+        Returns the block containing the item at an index, and the index of the item in the block
+        """
+        number = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+
+        while step:
+            if number + step < len(self.tree) and self.tree[number + step] <= index:
+                number += step
+                index -= self.tree[number]
+
+            step >>= 1
+
+        return self.blocks[number], index
+
+    ##################
+    # ACCESS METHODS #
+    ##################
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, item):
+        return item in self.owners
+
+    def __iter__(self):
+        return chain.from_iterable(self.blocks)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(block) for block in reversed(self.blocks))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.size)
+
+            if step != 1:
+                return list(self)[index]
+
+            return list(islice(self.iterate(start), max(0, stop - start)))
+
+        if index < 0:
+            index += self.size
+
+        if not 0 <= index < self.size:
+            raise IndexError("list index out of range")
+
+        block, i = self.locate(index)
+
+        return block[i]
+
+    def iterate(self, start=0):
+        """
+        Iterates over the items from an index
+        """
+        if start >= self.size:
+            return iter(())
+
+        block, i = self.locate(start)
+
+        return chain(block[i:], chain.from_iterable(self.blocks[block.number + 1:]))
+
+    def index(self, item):
+        """
+        Returns the position of an item
+        """
+        block = self.owners.get(item)
+
+        if block is None:
+            raise ValueError("{!r} is not in list".format(item))
+
+        return self.offset(block) + block.index(item)
+
+    def select(self, items):
+        """
+        Returns the items of the list found in a set, in list order, only going through the blocks holding them
+        """
+        numbers = sorted({self.owners[item].number for item in items if item in self.owners})
+
+        return [item for number in numbers for item in self.blocks[number] if item in items]
+
+    def copy(self):
+        """
+        Returns a copy of the list
+        """
+        return BlockList(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (BlockList, list)):
+            return list(self) == list(other)
+
+        return NotImplemented
+
+    def __repr__(self):
+        return "BlockList({!r})".format(list(self))
+
+    def __reduce__(self):
+        """
+        Pickles and copies are made from the items
+        """
+        return BlockList, (list(self),)
+
+    ########################
+    # MODIFICATION METHODS #
+    ########################
+
+    def insert(self, index, item):
+        """
+        Inserts an item before an index
+        """
+        if item in self.owners:
+            raise ValueError("{!r} is already in list".format(item))
+
+        if index < 0:
+            index = max(0, index + self.size)
+
+        index = min(index, self.size)
+
+        if not self.blocks:
+            self.blocks.append(Block())
+            self.reindex()
+
+        if index == self.size:
+            block, i = self.blocks[-1], len(self.blocks[-1])
+        else:
+            block, i = self.locate(index)
+
+        block.insert(i, item)
+
+        self.owners[item] = block
+        self.size += 1
+        self.resize(block, 1)
+
+        # large blocks are split in halves
+        if len(block) > 2 * BlockList.block_size:
+            half = Block(block[BlockList.block_size:])
+            del block[BlockList.block_size:]
+
+            for moved in half:
+                self.owners[moved] = half
+
+            self.blocks.insert(block.number + 1, half)
+            self.reindex()
+
+    def append(self, item):
+        """
+        Adds an item at the end
+        """
+        self.insert(self.size, item)
+
+    def extend(self, items):
+        """
+        Adds items at the end
+        """
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        """
+        Removes an item
+        """
+        block = self.owners.get(item)
+
+        if block is None:
+            raise ValueError("{!r} is not in list".format(item))
+
+        del block[block.index(item)]
+
+        self.discard(block, item)
+
+    def __delitem__(self, index):
+        if index < 0:
+            index += self.size
+
+        if not 0 <= index < self.size:
+            raise IndexError("list assignment index out of range")
+
+        block, i = self.locate(index)
+        item = block.pop(i)
+
+        self.discard(block, item)
+
+    def discard(self, block, item):
+        """
+        Updates the index after an item was removed from a block
+        """
+        del self.owners[item]
+
+        self.size -= 1
+        self.resize(block, -1)
+
+        # empty blocks are dropped
+        if not block:
+            del self.blocks[block.number]
+            self.reindex()
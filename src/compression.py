@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Transparent file compression
+
+Files are compressed while they are written, with the codec matching their extension (.gz, .xz or .bz2) or,
+for save files and backups, the codec set in the configuration file. Compressed files are detected by their
+signature when they are read.
+"""
+
+import bz2
+import gzip
+import lzma
+
+from config import ConfigFile
+
+config = ConfigFile()  # INI configuration file
+
+# codec modules, by name
+CODECS = {
+    "gzip": gzip,
+    "lzma": lzma,
+    "bz2": bz2
+}
+
+# codec names, by file extension
+EXTENSIONS = {
+    ".gz": "gzip",
+    ".xz": "lzma",
+    ".bz2": "bz2"
+}
+
+# codec names, by file signature
+SIGNATURES = [
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "lzma"),
+    (b"BZh", "bz2")
+]
+
+
+def default_codec():
+    """
+    Returns the codec used for save files and backups without a compression extension, None if disabled
+    """
+    codec = config.get_string("compression", "none")
+
+    return codec if codec in CODECS else None
+
+
+def from_extension(path):
+    """
+    Returns the codec matching a path's extension, None if the extension is not a compression extension
+    """
+    for extension, codec in EXTENSIONS.items():
+        if path.endswith(extension):
+            return codec
+
+    return None
+
+
+def strip_extension(path):
+    """
+    Returns a path without its compression extension
+    """
+    for extension in EXTENSIONS:
+        if path.endswith(extension):
+            return path[:-len(extension)]
+
+    return path
+
+
+def detect(path):
+    """
+    Returns the codec a file is compressed with, None if it is not compressed
+    """
+    with open(path, "rb") as f:
+        head = f.read(8)
+
+    for signature, codec in SIGNATURES:
+        if head.startswith(signature):
+            return codec
+
+    return None
+
+
+def open_write(path, mode="wb", codec=None, **kwargs):
+    """
+    Opens a file for writing, compressed with the codec if any
+    """
+    if codec is None:
+        return open(path, mode, **kwargs)
+
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+
+    return CODECS[codec].open(path, mode, **kwargs)
+
+
+def open_read(path, mode="rb", **kwargs):
+    """
+    Opens a file for reading, decompressing it if needed
+    """
+    codec = detect(path)
+
+    if codec is None:
+        return open(path, mode, **kwargs)
+
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+
+    return CODECS[codec].open(path, mode, **kwargs)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+SQLite save files
+
+Changes are applied to the database in one transaction per save, segments are identified by their JSON-encoded ids.
+Segments are ordered by positions spaced by a gap, so that a segment is inserted between its neighbours without moving
+the following ones, all positions being spread again once two neighbours leave no room. Removed segments are kept
+without a position, as other segments may still link to them. The ids of the filtered collection are stored with the
+state, and kept up to date as segments are inserted and removed.
+"""
+
+import json
+import os
+import sqlite3
+
+from bisect import bisect_left
+
+SIGNATURE = b"SQLite format 3\x00"  # file signature
+
+GAP = 1 << 20  # distance between the positions of consecutive segments, halved by each insertion between them
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id TEXT PRIMARY KEY,
+    position INTEGER,
+    raw TEXT NOT NULL,
+    original_raw TEXT,
+    participant TEXT,
+    datetime TEXT,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS segments_position ON segments (position);
+CREATE INDEX IF NOT EXISTS segments_participant ON segments (participant);
+
+CREATE TABLE IF NOT EXISTS annotations (
+    segment TEXT NOT NULL,
+    legacy INTEGER NOT NULL,
+    layer TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (segment, legacy, layer, type)
+);
+CREATE INDEX IF NOT EXISTS annotations_value ON annotations (legacy, layer, type, value);
+
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    legacy INTEGER NOT NULL,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS links_source ON links (source);
+CREATE INDEX IF NOT EXISTS links_target ON links (target);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def is_database(path):
+    """
+    Checks if a file starts with the SQLite signature
+    """
+    with open(path, "rb") as f:
+        return f.read(len(SIGNATURE)) == SIGNATURE
+
+
+class Database:
+    """
+    SQLite save file, written by applying journal records
+    """
+    extension = ".db"
+
+    def __init__(self, path):
+        """
+        Initializes the database of a save file, the connection is opened by the first write
+        """
+        self.path = path
+        self.connection = None  # writing connection, used by one thread at a time
+        self.failed = False  # whether a write failed, records are not applied after it
+        self.positions = None  # ascending positions of the segments, read by the first insertion or removal
+
+    def connect(self):
+        """
+        Returns the writing connection
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+
+        return self.connection
+
+    def close(self):
+        """
+        Closes the writing connection
+        """
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def apply(self, records):
+        """
+        Applies records to the database, in a single transaction
+        """
+        if not records:
+            return
+
+        connection = self.connect()
+
+        try:
+            self.apply_records(connection, records)
+        except Exception:
+            # positions of a rolled back transaction are read again
+            self.positions = None
+            raise
+
+    def apply_records(self, connection, records):
+        """
+        Applies records in a transaction of a connection
+        """
+        with connection:
+            state = Database.read_meta(connection, "state") or {}
+            view = state.get("view")  # ids of the filtered collection, None if it is not filtered
+            modified = False  # whether the state must be written
+
+            for record in records:
+                if record["op"] == "insert":
+                    Database.write_segment(connection, record["segment"], self.place(record["full_index"]))
+
+                    if view is not None:
+                        view.insert(record["view_index"], record["segment"]["id"])
+                        modified = True
+                elif record["op"] == "remove":
+                    identifier = json.dumps(record["id"])
+                    position = connection.execute("SELECT position FROM segments WHERE id = ?", (identifier,)).fetchone()
+
+                    if position is not None and position[0] is not None:
+                        positions = self.get_positions()
+
+                        connection.execute("UPDATE segments SET position = NULL WHERE id = ?", (identifier,))
+                        del positions[bisect_left(positions, position[0])]
+
+                    if view is not None and record["id"] in view:
+                        view.remove(record["id"])
+                        modified = True
+                elif record["op"] == "segment":
+                    identifier = json.dumps(record["segment"]["id"])
+                    position = connection.execute("SELECT position FROM segments WHERE id = ?", (identifier,)).fetchone()
+
+                    Database.write_segment(connection, record["segment"], position[0] if position else None)
+                elif record["op"] == "taxonomy":
+                    Database.write_meta(connection, "taxonomy", record["taxonomy"])
+                elif record["op"] == "state":
+                    state.update({key: value for key, value in record.items() if key not in ["op", "seq"]})
+                    view = state.get("view")
+                    modified = True
+
+            if modified:
+                Database.write_meta(connection, "state", state)
+
+    def get_positions(self):
+        """
+        Returns the ascending positions of the segments in the collection
+        """
+        if self.positions is None:
+            self.positions = [
+                position for position, in self.connect().execute("SELECT position FROM segments WHERE position IS NOT NULL ORDER BY position")
+            ]
+
+        return self.positions
+
+    def place(self, index):
+        """
+        Returns the position of a segment inserted at an index of the collection
+        """
+        positions = self.get_positions()
+        index = min(index, len(positions))
+
+        if index > 0 and index < len(positions) and positions[index] - positions[index - 1] < 2:
+            self.renumber()
+            positions = self.positions
+
+        if not positions:
+            position = 0
+        elif index == len(positions):
+            position = positions[-1] + GAP
+        elif index == 0:
+            position = positions[0] - GAP
+        else:
+            position = (positions[index - 1] + positions[index]) // 2
+
+        positions.insert(index, position)
+
+        return position
+
+    def renumber(self):
+        """
+        Spreads the positions of the segments by the gap, once two of them leave no room for an insertion
+        """
+        connection = self.connect()
+
+        identifiers = [identifier for identifier, in connection.execute("SELECT id FROM segments WHERE position IS NOT NULL ORDER BY position")]
+        self.positions = [n * GAP for n in range(len(identifiers))]
+
+        connection.executemany("UPDATE segments SET position = ? WHERE id = ?", zip(self.positions, identifiers))
+
+    @staticmethod
+    def write_segment(connection, segment, position):
+        """
+        Writes a segment record, replacing its annotations and outgoing links
+        """
+        identifier = json.dumps(segment["id"])
+
+        connection.execute(
+            "INSERT OR REPLACE INTO segments (id, position, raw, original_raw, participant, datetime, note) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                identifier,
+                position,
+                segment["raw"],
+                # original raws are only stored when they differ from the raw
+                None if segment["original_raw"] == segment["raw"] else json.dumps(segment["original_raw"], ensure_ascii=False),
+                segment["participant"],
+                segment["datetime"],
+                segment["note"]
+            )
+        )
+
+        connection.execute("DELETE FROM annotations WHERE segment = ?", (identifier,))
+        connection.execute("DELETE FROM links WHERE source = ?", (identifier,))
+
+        connection.executemany(
+            "INSERT INTO annotations (segment, legacy, layer, type, value) VALUES (?, ?, ?, ?, ?)",
+            [
+                (identifier, legacy, layer, annotation_type, value)
+                for legacy, name in enumerate(["annotations", "legacy"])
+                for layer, annotation in segment[name].items()
+                for annotation_type, value in annotation.items()
+            ]
+        )
+
+        connection.executemany(
+            "INSERT INTO links (source, target, legacy, type) VALUES (?, ?, ?, ?)",
+            [
+                (identifier, json.dumps(target), legacy, lt)
+                for legacy, name in enumerate(["links", "legacy_links"])
+                for target, lt in segment[name]
+            ]
+        )
+
+    @staticmethod
+    def read_meta(connection, key):
+        """
+        Returns a metadata value
+        """
+        row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    @staticmethod
+    def write_meta(connection, key, value):
+        """
+        Sets a metadata value
+        """
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+
+    @staticmethod
+    def write(path, records):
+        """
+        Writes a new database from records, replacing the file at once
+        """
+        temporary = "{}.part".format(path)
+
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+        database = Database(temporary)
+        database.apply(records)
+        database.close()
+
+        os.replace(temporary, path)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Binary save file container
+
+A .dia file starts with a header and a table of named sections, followed by the sections' payloads:
+
+    magic (4 bytes) | version (u16) | section count (u16)
+    section count * [name (4 bytes) | offset (u64) | length (u64)]
+    payloads
+
+Columns are stored as little-endian arrays, so that any section can be read without decoding the others.
+"""
+
+import mmap
+import struct
+import sys
+
+from array import array
+from collections import OrderedDict
+
+MAGIC = b"DIA\x00"  # file signature
+VERSION = 1  # format version
+
+HEADER = struct.Struct("<4sHH")  # magic, version, section count
+ENTRY = struct.Struct("<4sQQ")  # section name, offset, length
+
+
+class FormatError(Exception):
+    """
+    Raised when a file is not a valid .dia file
+    """
+    pass
+
+
+def is_dia(path):
+    """
+    Checks if a file starts with the .dia signature
+    """
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def map_file(path):
+    """
+    Memory-maps a file for reading, its pages are only loaded when accessed
+    """
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def iterdump(sections):
+    """
+    Returns the chunks of bytes of a file containing the sections, given as a name to bytes mapping, to be written in order
+    """
+    offset = HEADER.size + ENTRY.size * len(sections)
+    table = []
+
+    for name, payload in sections.items():
+        table.append(ENTRY.pack(name.encode("ascii"), offset, len(payload)))
+        offset += len(payload)
+
+    return [HEADER.pack(MAGIC, VERSION, len(sections)) + b"".join(table)] + list(sections.values())
+
+
+def dumps(sections):
+    """
+    Returns the bytes of a file containing the sections, given as a name to bytes mapping
+    """
+    return b"".join(iterdump(sections))
+
+
+def loads(data):
+    """
+    Returns the sections of a file, as a name to memoryview mapping
+    """
+    data = memoryview(data)
+
+    if len(data) < HEADER.size:
+        raise FormatError("truncated header")
+
+    magic, version, count = HEADER.unpack_from(data, 0)
+
+    if magic != MAGIC:
+        raise FormatError("not a .dia file")
+
+    if version > VERSION:
+        raise FormatError("unsupported version {}".format(version))
+
+    sections = OrderedDict()
+
+    for n in range(count):
+        name, offset, length = ENTRY.unpack_from(data, HEADER.size + ENTRY.size * n)
+
+        if offset + length > len(data):
+            raise FormatError("truncated section {}".format(name))
+
+        sections[name.decode("ascii")] = data[offset:offset + length]
+
+    return sections
+
+
+def pack_array(typecode, values):
+    """
+    Returns the little-endian bytes of an array
+    """
+    values = values if isinstance(values, array) else array(typecode, values)
+
+    if sys.byteorder == "big":
+        values = array(typecode, values)
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def unpack_array(typecode, data):
+    """
+    Returns an array from little-endian bytes
+    """
+    values = array(typecode)
+    values.frombytes(bytes(data))
+
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values
+
+
+def view_array(typecode, data):
+    """
+    Returns an indexable view on little-endian array bytes, without copying them when possible
+    """
+    if sys.byteorder == "little":
+        return memoryview(data).cast(typecode)
+
+    return unpack_array(typecode, data)
+
+
+def pack_strings(strings):
+    """
+    Returns the bytes of a string column, None values included
+    """
+    encoded = [b"" if s is None else s.encode("utf-8") for s in strings]
+
+    offsets = array("Q", [0])
+
+    for e in encoded:
+        offsets.append(offsets[-1] + len(e))
+
+    nulls = bytes(1 if s is None else 0 for s in strings)
+
+    return b"".join([
+        struct.pack("<Q", len(encoded)),
+        pack_array("Q", offsets),
+        nulls,
+        b"".join(encoded)
+    ])
+
+
+class StringColumn:
+    """
+    Read-only view on a string column, decoding values on access
+    """
+    def __init__(self, data):
+        """
+        Reads the column's offsets
+        """
+        data = memoryview(data)
+
+        self.count = struct.unpack_from("<Q", data, 0)[0]
+
+        start = 8
+        end = start + 8 * (self.count + 1)
+
+        self.offsets = view_array("Q", data[start:end])
+        self.nulls = data[end:end + self.count]
+        self.blob = data[end + self.count:]
+
+    def __len__(self):
+        """
+        Returns the number of values
+        """
+        return self.count
+
+    def __getitem__(self, i):
+        """
+        Decodes a value
+        """
+        if self.nulls[i]:
+            return None
+
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+
+def unpack_strings(data):
+    """
+    Returns the values of a string column
+    """
+    column = StringColumn(data)
+
+    return [column[i] for i in range(len(column))]
@@ -312,6 +312,12 @@ class GraphicalUserInterface(Frame):
         """
         pass  # pass on purpose
 
+    def manage_exit(self):
+        """
+        Exit management
+        """
+        pass  # pass on purpose
+
     ###############################
     # KEYBOARD MANAGEMENT METHODS #
     ##############################
@@ -428,6 +434,7 @@ class GraphicalUserInterface(Frame):
             self._("box.title.quit"),
             self._("box.text.quit")
         ):
+            self.manage_exit()
             self.parent.destroy()
 
     ###########################
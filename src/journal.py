@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Append-only change journal
+"""
+
+import codecs
+import json
+import logging
+import os
+
+from config import ConfigFile
+
+config = ConfigFile()  # INI configuration file
+
+
+class Journal:
+    """
+    Append-only log of the mutations applied to a collection since its last snapshot
+    """
+    extension = ".log"  # appended to the save file path
+
+    max_records = config.get_int("journal_size", 1000)  # number of records before compaction
+
+    def __init__(self, path, sequence=0):
+        """
+        Initializes the journal of a save file
+        """
+        self.save_path = path  # path of the snapshot
+        self.path = "{}{}".format(path, Journal.extension)
+        self.sequence = sequence  # sequence number of the last record
+        self.size = 0  # number of records appended since the last compaction
+        self.torn = False  # whether an incomplete record was found
+        self.failed = False  # whether a write failed, records are not appended after it
+
+    def stamp(self, records):
+        """
+        Assigns sequence numbers to records, before they are appended
+        """
+        for record in records:
+            self.sequence += 1
+            record["seq"] = self.sequence
+
+        return records
+
+    def append(self, records):
+        """
+        Appends records to the journal
+        """
+        if not records:
+            return
+
+        lines = []
+
+        for record in records:
+            if "seq" not in record:
+                self.stamp([record])
+
+            lines.append(json.dumps(record, ensure_ascii=False))
+
+        with codecs.open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        self.size += len(records)
+
+    def read(self):
+        """
+        Returns the records appended after the snapshot
+        """
+        records = []
+
+        if not os.path.exists(self.path):
+            return records
+
+        with codecs.open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # incomplete record, written during a crash
+                    logging.warning("Journal.read(): incomplete record in {}".format(self.path))
+                    self.torn = True
+                    break
+
+                # records older than the snapshot are ignored
+                if record["seq"] > self.sequence:
+                    records.append(record)
+
+        if records:
+            self.sequence = records[-1]["seq"]
+
+        self.size = len(records)
+
+        return records
+
+    def is_full(self):
+        """
+        Checks if the journal should be compacted into a snapshot
+        """
+        return self.size >= Journal.max_records
+
+    def clear(self):
+        """
+        Empties the journal, once its records are included in a snapshot
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self.size = 0
+        self.torn = False
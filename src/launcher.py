@@ -14,10 +14,15 @@ Launcher
 import doctest
 import sys
 
+from time import perf_counter
+
+LAUNCH_TIME = perf_counter()  # before the other imports, which are part of the startup
+
 from argparse import ArgumentParser
 
 from annotator import Annotator
 from config import ConfigFile
+from profiler import StartupProfiler
 
 APP_TITLE = "DiAnnotator"  # hardcoded application title
 VERSION_NUMBER = "alpha 17.10.12"  # hardcoded version number
@@ -52,6 +57,13 @@ def parse_args():
         action="store_true",
         help="displays the current version of the application")
 
+    ap.add_argument(
+        "-p", "--profile-startup",
+        dest="profile_startup",
+        default=False,
+        action="store_true",
+        help="prints the duration of each startup stage")
+
     return ap.parse_args()
 
 if __name__ == "__main__":
@@ -65,8 +77,11 @@ if __name__ == "__main__":
     if arguments.version:
         sys.exit("{} {}".format(APP_TITLE, VERSION_NUMBER))
 
+    profiler = StartupProfiler(arguments.profile_startup, LAUNCH_TIME)
+    profiler.mark("imports")
+
     # creates the annotation engine
-    annotator = Annotator()
+    annotator = Annotator(profiler)
 
     if arguments.fullscreen:
         annotator.toggle_fullscreen()  # toggles fullscreen
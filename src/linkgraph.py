@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Link graph
+
+Links between segments, as adjacency sets keyed by segment ids, also indexed by link type.
+"""
+
+
+class LinkGraph:
+    """
+    Directed links between segments, identified by their ids
+    """
+    def __init__(self):
+        """
+        Initializes an empty graph
+        """
+        self.links = {}  # outgoing (target, link type) pairs, by source
+        self.linked = {}  # incoming (source, link type) pairs, by target
+        self.types = {}  # (source, target) pairs, by link type
+
+    def add(self, source, target, link_type):
+        """
+        Adds a link
+        """
+        self.links.setdefault(source, set()).add((target, link_type))
+        self.linked.setdefault(target, set()).add((source, link_type))
+        self.types.setdefault(link_type, set()).add((source, target))
+
+    def discard(self, source, target, link_type):
+        """
+        Removes a link, if it exists
+        """
+        for index, key, edge in [
+            (self.links, source, (target, link_type)),
+            (self.linked, target, (source, link_type)),
+            (self.types, link_type, (source, target))
+        ]:
+            edges = index.get(key)
+
+            if edges is not None:
+                edges.discard(edge)
+
+                # empty sets are dropped
+                if not edges:
+                    del index[key]
+
+    def set_links(self, source, links):
+        """
+        Replaces the outgoing links of a source with (target, link type) pairs
+        """
+        links = set(links)
+        current = self.links.get(source, set())
+
+        for target, link_type in current - links:
+            self.discard(source, target, link_type)
+
+        for target, link_type in links - current:
+            self.add(source, target, link_type)
+
+    def get_links(self, source):
+        """
+        Returns the outgoing links of a source, as (target, link type) pairs
+        """
+        return set(self.links.get(source, ()))
+
+    def get_linked(self, target):
+        """
+        Returns the incoming links of a target, as (source, link type) pairs
+        """
+        return set(self.linked.get(target, ()))
+
+    def get_sources(self, link_type):
+        """
+        Returns the sources of the links of a type
+        """
+        return {source for source, target in self.types.get(link_type, ())}
+
+    def count(self, link_type):
+        """
+        Returns the number of links of a type
+        """
+        return len(self.types.get(link_type, ()))
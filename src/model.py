@@ -12,17 +12,35 @@ Segment modelisation classes
 """
 
 import codecs
+import compression
 import csv
+import dia
 import json
 import logging
 import os
 import pickle
+import sqlite3
 import tempfile
 
-from collections import OrderedDict, Mapping
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
 from copy import deepcopy
+from datetime import datetime, timedelta, timezone
 from dateutil import parser
+from functools import lru_cache
+from itertools import chain, islice
 from nltk.tokenize import WhitespaceTokenizer
+from threading import RLock
+
+from annotationstore import AnnotationStore, PRESENCE
+from backup import BackupStore
+from blocklist import BlockList
+from database import Database, is_database
+from journal import Journal
+from linkgraph import LinkGraph
+from symbols import SymbolTable
+from textindex import TextIndex
 
 # check if the current file is in a folder name "src"
 EXEC_FROM_SOURCE = os.path.dirname(os.path.abspath(__file__)).split("/")[-1] == "src"
@@ -30,26 +48,234 @@ EXEC_FROM_SOURCE = os.path.dirname(os.path.abspath(__file__)).split("/")[-1] ==
 # symbol for merged original raws
 MERGE_SYMBOL = "<<MERGED<<"
 
+# lazy segments are decoded by the interface and by saves running on the autosave thread
+DECODE_LOCK = RLock()
+
+# origin of timestamps
+EPOCH = datetime(1970, 1, 1)
+
+# resolutions of timestamps, in microseconds
+SECOND = 10 ** 6
+MINUTE = 60 * SECOND
+DAY = 24 * 60 * MINUTE
+
+# seconds of exported datetimes
+SECONDS = [":{:02d}".format(n) for n in range(60)]
+
+# tokenizer of segment raws
+tokenizer = WhitespaceTokenizer()
+
+
+class PendingDict(dict):
+    """
+    Empty dict standing for a segment's missing container, stored in the segment when first modified
+    """
+    __slots__ = ["owner", "name"]
+
+    def __init__(self, owner, name):
+        """
+        Creates the dict of an owner's slot
+        """
+        dict.__init__(self)
+        self.owner = owner
+        self.name = name
+
+    def attach(self):
+        """
+        Stores the dict in its owner, before it is modified
+        """
+        if self.owner is not None:
+            setattr(self.owner, self.name, self)
+            self.owner = None
+
+    def __setitem__(self, key, value):
+        self.attach()
+        dict.__setitem__(self, key, value)
+
+    def setdefault(self, key, default=None):
+        self.attach()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.attach()
+        dict.update(self, *args, **kwargs)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles are regular dicts
+        """
+        return dict, (dict(self),)
+
+
+class PendingList(list):
+    """
+    Empty list standing for a segment's missing container, stored in the segment when first modified
+    """
+    __slots__ = ["owner", "name"]
+
+    def __init__(self, owner, name):
+        """
+        Creates the list of an owner's slot
+        """
+        list.__init__(self)
+        self.owner = owner
+        self.name = name
+
+    def attach(self):
+        """
+        Stores the list in its owner, before it is modified
+        """
+        if self.owner is not None:
+            setattr(self.owner, self.name, self)
+            self.owner = None
+
+    def __setitem__(self, index, value):
+        self.attach()
+        list.__setitem__(self, index, value)
+
+    def __iadd__(self, values):
+        self.attach()
+        return list.__iadd__(self, values)
+
+    def append(self, value):
+        self.attach()
+        list.append(self, value)
+
+    def extend(self, values):
+        self.attach()
+        list.extend(self, values)
+
+    def insert(self, index, value):
+        self.attach()
+        list.insert(self, index, value)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles are regular lists
+        """
+        return list, (list(self),)
+
+
+def container(name, factory):
+    """
+    Returns the property of a segment container, which is not allocated while it is empty
+    """
+    slot = "_" + name
+
+    def getter(self):
+        value = getattr(self, slot)
+
+        return factory(self, slot) if value is None else value
+
+    def setter(self, value):
+        setattr(self, slot, value or None)
+
+    return property(getter, setter)
+
 
 class Segment:
+    # segments are numerous, their attributes are stored in slots rather than in a dict
+    __slots__ = [
+        "id", "_raw", "original_raw", "participant", "timestamp", "note", "generation",
+        "span",  # only set by CSV imports
+        "_annotations", "_legacy", "_links", "_legacy_links", "_linked", "_legacy_linked",
+        "_tokens",  # cache, not persisted
+        "_lazy"  # only set by lazy segments
+    ]
+
+    transient = ["_tokens", "_lazy"]  # slots left out of pickles
+
+    # containers, None while empty
+    annotations = container("annotations", PendingDict)  # annotations
+    legacy = container("legacy", PendingDict)  # legacy annotations
+    links = container("links", PendingList)  # segments linked to this one
+    legacy_links = container("legacy_links", PendingList)  # segments linked to this one (legacy)
+    linked = container("linked", PendingList)  # segments that this one links to
+    legacy_linked = container("legacy_linked", PendingList)  # segments that this one links to (legacy)
+
     def __init__(self, raw, participant, datetime):
         """
         Segment constructor
         """
-        self.id = id(self)  # random unique ID
+        self.id = None  # unique ID, allocated by the collection
         self.raw = raw  # raw text
         self.original_raw = raw  # full original raw text
         self.participant = participant  # speaker name
-        self.annotations = {}  # annotations
-        self.legacy = {}  # legacy annotations
-        self.datetime = datetime  # datetime
-        self.links = []  # segments linked to this one
-        self.legacy_links = []  # segments linked to this one (legacy)
-        self.linked = []  # segments that this one links to
-        self.legacy_linked = []  # segments that this one links to (legacy)
+        self.datetime = datetime  # datetime, stored as a timestamp
         self.note = None  # note about the segment
+        self.generation = 0  # incremented by every modification
+
+        self._annotations = self._legacy = None
+        self._links = self._legacy_links = self._linked = self._legacy_linked = None
 
-        self.tokenize()  # tokenization
+    def __getstate__(self):
+        """
+        Returns the segment's attributes, as a dict
+        """
+        return {name: getattr(self, name) for name in Segment.__slots__ if name not in Segment.transient and hasattr(self, name)}
+
+    def __setstate__(self, state):
+        """
+        Restores the segment's attributes, including those of segments pickled before slots, whose containers are named without underscores
+        """
+        self.note = None
+        self.generation = 0  # segments saved before change tracking
+
+        self._annotations = self._legacy = None
+        self._links = self._legacy_links = self._linked = self._legacy_linked = None
+        self._tokens = None  # computed again on first access
+
+        for name, value in state.items():
+            # tokens were pickled before they were cached
+            if name != "tokens":
+                setattr(self, name, value)
+
+    @property
+    def raw(self):
+        """
+        Raw text
+        """
+        return self._raw
+
+    @raw.setter
+    def raw(self, raw):
+        self._raw = raw
+        self._tokens = None  # tokens of the previous raw
+
+    @property
+    def datetime(self):
+        """
+        Datetime, computed from the timestamp
+        """
+        return from_timestamp(self.timestamp)
+
+    @datetime.setter
+    def datetime(self, datetime):
+        self.timestamp = to_timestamp(datetime)  # microseconds since the epoch
+
+    def format_datetime(self, date_format, resolution=SECOND):
+        """
+        Returns the datetime as a string, formatted from the timestamp truncated to a resolution so that strings are shared
+        """
+        return format_timestamp(self.timestamp - self.timestamp % resolution, date_format)
+
+    def format_export_datetime(self):
+        """
+        Returns the datetime as written in exports, the date and time down to the minute being formatted once per minute
+        """
+        timestamp = self.timestamp
+
+        return format_timestamp(timestamp - timestamp % MINUTE, "%d-%m-%y %H:%M") + SECONDS[timestamp % MINUTE // SECOND]
+
+    @property
+    def tokens(self):
+        """
+        Tokens of the raw text, computed on first access
+        """
+        if self._tokens is None:
+            self._tokens = tokenizer.tokenize(self.raw)
+
+        return self._tokens
 
     #############################
     # ANNOTATION ACCESS METHODS #
@@ -91,6 +317,8 @@ class Segment:
 
         dic[layer][annotation_type] = value
 
+        self.generation += 1
+
     def rem(self, layer, qualifier=False, legacy=False):
         """
         Deletes a segment's annotation
@@ -101,6 +329,8 @@ class Segment:
         if layer in dic and annotation_type in dic[layer]:
             del dic[layer][annotation_type]
 
+            self.generation += 1
+
     ##################
     # EXPORT METHODS #
     ##################
@@ -119,7 +349,7 @@ class Segment:
             "segment": self.raw,
             "raw": self.original_raw,
             "participant": self.participant,
-            "datetime": self.datetime.strftime("%d-%m-%y %X"),
+            "datetime": self.format_export_datetime(),
             "note": self.note,
             "links": links,
             "annotations": self.annotations
@@ -135,7 +365,7 @@ class Segment:
         data.update({"segment": self.raw})
         data.update({"raw": self.original_raw if isinstance(self.original_raw, str) else MERGE_SYMBOL.join(self.original_raw)})
         data.update({"participant": self.participant})
-        data.update({"datetime": self.datetime.strftime("%d-%m-%y %X")})
+        data.update({"datetime": self.format_export_datetime()})
         data.update({"note": self.note if self.note is not None else ""})
         data.update({"links": ",".join(["{}-{}".format(segment.id, lt) for segment, lt in self.links])})
 
@@ -175,16 +405,61 @@ class Segment:
 
         return data
 
-    ###############
-    # NLP METHODS #
-    ###############
+    ##################
+    # RECORD METHODS #
+    ##################
 
-    def tokenize(self):
+    def to_record(self):
         """
-        Tokenizes the segment
+        Returns a dict representation of the segment's state for the journal
         """
-        tokenizer = WhitespaceTokenizer()
-        self.tokens = tokenizer.tokenize(self.raw)
+        return {
+            "id": self.id,
+            "raw": self.raw,
+            "original_raw": self.original_raw,
+            "participant": self.participant,
+            "datetime": self.datetime.isoformat(),
+            "note": self.note,
+            "annotations": {layer: dict(annotation) for layer, annotation in self.annotations.items()},
+            "legacy": {layer: dict(annotation) for layer, annotation in self.legacy.items()},
+            "links": [[ls.id, lt] for ls, lt in self.links],
+            "legacy_links": [[ls.id, lt] for ls, lt in self.legacy_links]
+        }
+
+    @staticmethod
+    def from_record(record):
+        """
+        Creates a segment from a journal record
+        """
+        segment = Segment(record["raw"], record["participant"], parser.parse(record["datetime"]))
+        segment.id = record["id"]
+
+        return segment
+
+    def restore(self, record, segments_by_id):
+        """
+        Restores the segment's state from a journal record
+        """
+        self.raw = record["raw"]
+        self.original_raw = record["original_raw"]
+        self.note = record["note"]
+        self.annotations = record["annotations"]
+        self.legacy = record["legacy"]
+
+        # outgoing links are rewired, incoming links are restored by their sources' records
+        for ls, lt in self.links:
+            if (self, lt) in ls.linked:
+                ls.linked.remove((self, lt))
+
+        self.links = []
+
+        for identifier, lt in record["links"]:
+            if identifier in segments_by_id:
+                self.create_link(segments_by_id[identifier], lt)
+
+        self.legacy_links = [(segments_by_id[identifier], lt) for identifier, lt in record["legacy_links"] if identifier in segments_by_id]
+
+        self.generation += 1
 
     ###########################
     # LINK MANAGEMENT METHODS #
@@ -207,31 +482,31 @@ class Segment:
         self.links.append((target, link_type))
         target.linked.append((self, link_type))
 
+        self.generation += 1
+        target.generation += 1
+
     def remove_links(self, target):
         """
         Removes a link between two segments
         """
-        for ls, lt in self.links:
-            if ls == target:
-                self.links.remove((target, lt))
+        self.links = [(ls, lt) for ls, lt in self.links if ls != target]
+        target.linked = [(ls, lt) for ls, lt in target.linked if ls != self]
 
-        for lls, llt in target.linked:
-            if lls == self:
-                target.linked.remove((self, llt))
+        self.generation += 1
+        target.generation += 1
 
     def replace_links(self, target, new_target):
         """
-        Removes a link between two segments
+        Moves the links between two segments to another target
         """
-        for ls, lt in self.links:
-            if ls == target:
-                self.links.remove((target, lt))
-                self.links.append((new_target, lt))
+        self.links = [(new_target if ls == target else ls, lt) for ls, lt in self.links]
+
+        new_target.linked.extend((ls, lt) for ls, lt in target.linked if ls == self)
+        target.linked = [(ls, lt) for ls, lt in target.linked if ls != self]
 
-        for ls, lt in target.linked:
-            if ls == self:
-                target.linked.remove((self, lt))
-                new_target.linked.append((self, lt))
+        self.generation += 1
+        target.generation += 1
+        new_target.generation += 1
 
     ################################
     # SEGMENT MODIFICATION METHODS #
@@ -251,6 +526,10 @@ class Segment:
         # outgoing links are removed for s2
         s2.links = []
 
+        # s1 takes over outgoing links
+        for ls, lt in s1.links:
+            ls.linked.append((s1, lt))
+
         # preserves links
         for ls, lt in self.linked:
             ls.replace_links(self, s2)
@@ -290,6 +569,10 @@ class Segment:
         for split in splits[1:]:
             split.links = []
 
+        # the first split takes over outgoing links
+        for ls, lt in splits[0].links:
+            ls.linked.append((splits[0], lt))
+
         # preserves links
         for ls, lt in self.linked:
             ls.replace_links(self, splits[-1])
@@ -303,22 +586,16 @@ class Segment:
         join = "" if not self.raw or self.raw[0] in [",", "."] else " "
         self.raw = segment.raw + join + self.raw
 
-        # preserving original raws, as a list
+        # preserving original raws, as a new list in which the splits of a message only appear once
         original_raw = []
 
-        if isinstance(segment.original_raw, str):
-            original_raw.append(segment.original_raw)
-        else:
-            original_raw = segment.original_raw
-
-        if isinstance(self.original_raw, str):
-            original_raw.append(self.original_raw)
-        else:
-            original_raw = original_raw + self.original_raw
+        for raws in [segment.original_raw, self.original_raw]:
+            for raw in [raws] if isinstance(raws, str) else raws:
+                if not original_raw or original_raw[-1] != raw:
+                    original_raw.append(raw)
 
-        self.original_raw = original_raw
-
-        self.tokenize()
+        # splits of a single message merged back together
+        self.original_raw = original_raw[0] if len(original_raw) == 1 else original_raw
 
         self.annotations = self.update(self.annotations, segment.annotations)
         self.legacy = self.update(self.legacy, segment.legacy)
@@ -339,6 +616,8 @@ class Segment:
         for ls, lt in segment.linked:
             ls.replace_links(segment, self)
 
+        self.generation += 1
+
     #################
     # OTHER METHODS #
     #################
@@ -357,31 +636,399 @@ class Segment:
 
     def copy(self, s):
         """
-        Creates and returns a copy
+        Creates and returns a copy, linked to the same segments
         """
         # copy segment values to self
         if isinstance(s, Segment):
             copy = self
             copy.raw = s.raw
             source = s
-        # make a new copy
+
+            # incoming links are part of the copied values
+            copy.linked = list(source.linked)
+            copy.legacy_linked = list(source.legacy_linked)
+        # make a new copy, which no segment links to yet
         else:
             copy = Segment(s, self.participant, self.datetime)
             source = self
 
-        copy.original_raw = source.original_raw
-        copy.annotations = deepcopy(source.annotations)
-        copy.legacy = deepcopy(source.legacy)
-        copy.links = deepcopy(source.links)
-        copy.linked = deepcopy(source.linked)
-        copy.legacy_links = deepcopy(source.links)
-        copy.legacy_linked = deepcopy(source.linked)
+        copy.original_raw = source.original_raw  # shared, original raws are never modified in place
         copy.note = source.note
 
-        copy.tokenize()
+        # annotations are copied layer by layer, links are copied as references to the linked segments
+        copy.annotations = {layer: dict(annotation) for layer, annotation in source.annotations.items()}
+        copy.legacy = {layer: dict(annotation) for layer, annotation in source.legacy.items()}
+        copy.links = list(source.links)
+        copy.legacy_links = list(source.legacy_links)
+
+        copy.generation += 1
 
         return copy
 
+    def snapshot(self, source=None):
+        """
+        Returns a copy of the segment's state, still linked to the same segments, which later modifications do not reach
+        """
+        copy = Segment.__new__(Segment)
+        copy.__setstate__(self.__getstate__())
+
+        copy.annotations = {layer: dict(annotation) for layer, annotation in self.annotations.items()}
+        copy.legacy = {layer: dict(annotation) for layer, annotation in self.legacy.items()}
+
+        for name in ["links", "legacy_links", "linked", "legacy_linked"]:
+            setattr(copy, name, list(getattr(self, name)))
+
+        return copy
+
+
+class LazySegment(Segment):
+    """
+    Segment of a .dia snapshot, whose attributes are decoded on first access
+    """
+    # attributes decoded together, by group
+    groups = {
+        "id": "id",
+        "raw": "text",
+        "original_raw": "text",
+        "tokens": "text",
+        "participant": "participant",
+        "timestamp": "datetime",
+        "note": "note",
+        "annotations": "annotations",
+        "legacy": "annotations",
+        "links": "links",
+        "linked": "links",
+        "legacy_links": "links",
+        "legacy_linked": "links"
+    }
+
+    __slots__ = []
+
+    def __init__(self, source, index):
+        """
+        Creates a segment without decoding it
+        """
+        # snapshot the segment is read from, position of the segment in the snapshot and groups not decoded yet
+        object.__setattr__(self, "_lazy", (source, index, set(LazySegment.groups.values())))
+        object.__setattr__(self, "generation", 0)
+
+    def __getattr__(self, name):
+        """
+        Decodes an attribute on first access
+        """
+        group = LazySegment.groups.get(name)
+
+        if group is None:
+            raise AttributeError(name)
+
+        self.decode(group)
+
+        # the group may have been decoded by another thread, attributes still missing are not part of the segment
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        """
+        Decodes an attribute's group before it is modified, so that the change is not overwritten later
+        """
+        group = LazySegment.groups.get(name)
+
+        if group is not None:
+            self.decode(group)
+
+        object.__setattr__(self, name, value)
+
+    def __reduce_ex__(self, protocol):
+        """
+        Copies and pickles are made from the decoded segment
+        """
+        self.materialize()
+
+        return self.__reduce_ex__(protocol)
+
+    def decode(self, group):
+        """
+        Decodes a group of attributes unless it already is, the segment becomes a regular segment once all of them are decoded
+        """
+        with DECODE_LOCK:
+            if self._lazy is None or group not in self._lazy[2]:
+                return
+
+            source, index, pending = self._lazy
+
+            # the group stays pending until its attributes are set, for other threads to wait for them
+            source.decode(self, index, group)
+            pending.discard(group)
+
+            if not pending:
+                object.__setattr__(self, "_lazy", None)
+                object.__setattr__(self, "__class__", Segment)
+
+    def snapshot(self, source=None):
+        """
+        Returns a copy of the segment's state, whose attributes not decoded yet are decoded through a capture source
+        """
+        with DECODE_LOCK:
+            if self._lazy is None:
+                return Segment.snapshot(self)
+
+            segment_source, index, pending = self._lazy
+
+            copy = LazySegment(source, (segment_source, index))
+            object.__setattr__(copy, "_lazy", (source, (segment_source, index), set(pending)))
+            object.__setattr__(copy, "generation", self.generation)
+
+            # attributes already decoded may have been modified since
+            for name, group in LazySegment.groups.items():
+                if group not in pending and name != "tokens":
+                    value = getattr(self, name)
+
+                    if isinstance(value, dict):
+                        value = {layer: dict(annotation) for layer, annotation in value.items()}
+                    elif isinstance(value, list):
+                        value = list(value)
+
+                    object.__setattr__(copy, name, value)
+
+            return copy
+
+    def materialize(self):
+        """
+        Decodes all the segment's attributes
+        """
+        # the segment stops being lazy with its last group
+        for group in set(LazySegment.groups.values()):
+            LazySegment.decode(self, group)
+
+
+class SnapshotSource:
+    """
+    Columns of a .dia snapshot, read segment by segment
+    """
+    def __init__(self, sections, meta, symbols):
+        """
+        Reads the snapshot's index, without decoding the segments, and interns its participants, layers and values in a symbol table
+        """
+        self.meta = meta
+
+        meta["participants"] = [symbols.intern(participant) for participant in meta["participants"]]
+        meta["annotations"] = [(legacy, symbols.intern(layer), symbols.intern(annotation_type)) for legacy, layer, annotation_type in meta["annotations"]]
+        meta["values"] = [symbols.intern(value) for value in meta["values"]]
+
+        self.ids = dia.StringColumn(sections["IDS "])
+        self.raws = dia.StringColumn(sections["RAW "])
+        self.originals = dia.StringColumn(sections["ORIG"])
+        self.merged = sections["MRGD"]
+        self.notes = dia.StringColumn(sections["NOTE"])
+        self.participants = dia.view_array("I", sections["PART"])
+        self.timestamps = dia.view_array("q", sections["TIME"])
+        self.annotations = dia.view_array("I", sections["ANNO"])
+
+        self.segments = [LazySegment(self, i) for i in range(len(self.ids))]
+
+        self.texts = {}  # original raws, shared by the segments of a message
+
+        # outgoing and incoming links by segment index, as (index, link type code) pairs
+        self.links = [{}, {}]
+        self.linked = [{}, {}]
+
+        for legacy, name in enumerate(["LINK", "LLNK"]):
+            edges = dia.view_array("I", sections[name])
+
+            for n in range(0, len(edges), 3):
+                source, target, lt = edges[n], edges[n + 1], edges[n + 2]
+
+                self.links[legacy].setdefault(source, []).append((target, lt))
+                self.linked[legacy].setdefault(target, []).append((source, lt))
+
+    def decode(self, segment, i, group):
+        """
+        Sets a group of attributes of the segment at index i
+        """
+        setter = lambda name, value: object.__setattr__(segment, name, value)
+
+        if group == "id":
+            setter("id", json.loads(self.ids[i]))
+        elif group == "text":
+            raw = self.raws[i]
+            original_raw = self.originals[i]
+
+            if self.merged[i]:
+                original_raw = [self.texts.setdefault(text, text) for text in original_raw.split(MERGE_SYMBOL)]
+            elif original_raw is None:
+                original_raw = raw
+            else:
+                original_raw = self.texts.setdefault(original_raw, original_raw)
+
+            setter("raw", raw)
+            setter("original_raw", original_raw)
+        elif group == "participant":
+            setter("participant", self.meta["participants"][self.participants[i]])
+        elif group == "datetime":
+            setter("timestamp", self.timestamps[i])
+        elif group == "note":
+            setter("note", self.notes[i])
+        elif group == "annotations":
+            dics = [{}, {}]
+
+            for n, (legacy, layer, annotation_type) in enumerate(self.meta["annotations"]):
+                code = self.annotations[n * len(self.segments) + i]
+
+                if code:
+                    dics[legacy].setdefault(layer, {})[annotation_type] = self.meta["values"][code - 1]
+
+            setter("annotations", dics[0])
+            setter("legacy", dics[1])
+        elif group == "links":
+            for legacy, prefix in enumerate(["", "legacy_"]):
+                setter(prefix + "links", [(self.segments[j], self.meta["link_types"][lt]) for j, lt in self.links[legacy].get(i, [])])
+                setter(prefix + "linked", [(self.segments[j], self.meta["link_types"][lt]) for j, lt in self.linked[legacy].get(i, [])])
+
+    def get_participants(self):
+        """
+        Returns the participants of the snapshot, without decoding the segments
+        """
+        return list(self.meta["participants"])
+
+    def get_legacy_layers(self):
+        """
+        Returns the legacy layers of the snapshot, without decoding the segments
+        """
+        return list(OrderedDict.fromkeys(layer for legacy, layer, annotation_type in self.meta["annotations"] if legacy))
+
+
+class CaptureSource:
+    """
+    Source of the lazy segments of a capture, decoded from the sources of the captured segments
+    """
+    def __init__(self):
+        """
+        Initializes the source, before the segments are copied
+        """
+        self.copies = {}  # copies, by captured segment
+
+    def decode(self, segment, index, group):
+        """
+        Sets a group of attributes of a copy from the source of its segment
+        """
+        source, i = index
+
+        source.decode(segment, i, group)
+
+        if group == "links":
+            self.redirect(segment)
+
+    def redirect(self, segment):
+        """
+        Points the links of a copy to the copies of the linked segments, links to segments out of the capture being kept
+        """
+        for name in ["links", "legacy_links", "linked", "legacy_linked"]:
+            object.__setattr__(segment, name, [(self.copies.get(ls, ls), lt) for ls, lt in getattr(segment, name)])
+
+
+class DatabaseSource:
+    """
+    Rows of a SQLite save file, read segment by segment
+    """
+    def __init__(self, path, symbols):
+        """
+        Reads the order of the segments, without decoding them
+        """
+        self.path = os.path.abspath(path)
+        self.connection = sqlite3.connect(path, check_same_thread=False)  # decodings are serialized by DECODE_LOCK
+
+        # removed segments are included, as other segments may still link to them
+        self.segments_by_id = OrderedDict(
+            (identifier, LazySegment(self, identifier))
+            for identifier, in self.connection.execute("SELECT id FROM segments")
+        )
+
+        self.segments = [
+            self.segments_by_id[identifier]
+            for identifier, in self.connection.execute("SELECT id FROM segments WHERE position IS NOT NULL ORDER BY position")
+        ]
+
+        self.taxonomy = Database.read_meta(self.connection, "taxonomy")
+        self.state = Database.read_meta(self.connection, "state")
+
+        self.texts = {}  # original raws, shared by the segments of a message
+        self.symbols = symbols  # participants, layers and values, shared with the collection
+
+    def decode(self, segment, identifier, group):
+        """
+        Sets a group of attributes of a segment from its rows
+        """
+        setter = lambda name, value: object.__setattr__(segment, name, value)
+        select = lambda query: self.connection.execute(query, (identifier,)).fetchall()
+
+        if group == "id":
+            setter("id", json.loads(identifier))
+        elif group == "text":
+            raw, original_raw = select("SELECT raw, original_raw FROM segments WHERE id = ?")[0]
+
+            setter("raw", raw)
+            if original_raw is None:
+                original_raw = raw
+            else:
+                original_raw = json.loads(original_raw)
+
+                if isinstance(original_raw, str):
+                    original_raw = self.texts.setdefault(original_raw, original_raw)
+                else:
+                    original_raw = [self.texts.setdefault(text, text) for text in original_raw]
+
+            setter("original_raw", original_raw)
+        elif group == "participant":
+            setter("participant", self.symbols.intern(select("SELECT participant FROM segments WHERE id = ?")[0][0]))
+        elif group == "datetime":
+            setter("timestamp", to_timestamp(parser.parse(select("SELECT datetime FROM segments WHERE id = ?")[0][0])))
+        elif group == "note":
+            setter("note", select("SELECT note FROM segments WHERE id = ?")[0][0])
+        elif group == "annotations":
+            dics = [{}, {}]
+
+            intern = self.symbols.intern
+
+            for legacy, layer, annotation_type, value in select("SELECT legacy, layer, type, value FROM annotations WHERE segment = ?"):
+                dics[legacy].setdefault(intern(layer), {})[intern(annotation_type)] = intern(value)
+
+            setter("annotations", dics[0])
+            setter("legacy", dics[1])
+        elif group == "links":
+            links = {"links": [], "legacy_links": [], "linked": [], "legacy_linked": []}
+
+            for target, legacy, lt in select("SELECT target, legacy, type FROM links WHERE source = ? ORDER BY rowid"):
+                if target in self.segments_by_id:
+                    links["legacy_links" if legacy else "links"].append((self.segments_by_id[target], lt))
+
+            for source, legacy, lt in select("SELECT source, legacy, type FROM links WHERE target = ? ORDER BY rowid"):
+                if source in self.segments_by_id:
+                    links["legacy_linked" if legacy else "linked"].append((self.segments_by_id[source], lt))
+
+            for name, value in links.items():
+                setter(name, value)
+
+    def get_participants(self):
+        """
+        Returns the participants of the collection, without decoding the segments
+        """
+        return [participant for participant, in self.connection.execute("SELECT DISTINCT participant FROM segments WHERE position IS NOT NULL")]
+
+    def get_legacy_layers(self):
+        """
+        Returns the legacy layers of the collection, without decoding the segments
+        """
+        return [layer for layer, in self.connection.execute("SELECT DISTINCT layer FROM annotations WHERE legacy = 1")]
+
+    def release(self):
+        """
+        Decodes the remaining segments and closes the file, before it is replaced
+        """
+        for segment in self.segments_by_id.values():
+            if isinstance(segment, LazySegment):
+                segment.materialize()
+
+        self.connection.close()
+
 
 class SegmentCollection:
     """
@@ -400,7 +1047,7 @@ class SegmentCollection:
         """
         Initialization of the segment collection
         """
-        self.save_file = os.path.abspath("{}tmp.pic".format(SegmentCollection.save_dir))
+        self.save_file = os.path.abspath("{}tmp.dia".format(SegmentCollection.save_dir))
 
         self.full_collection = []  # full collection of segments
         self.collection = self.full_collection.copy()  # current collection used
@@ -419,6 +1066,111 @@ class SegmentCollection:
         self.default_layer = None  # default layer
         self.filter = False  # active filter
 
+        self.journal_sequence = 0  # last journal record included in the snapshot
+
+        self.segments_by_id = None  # segments by id, built on first lookup
+        self.next_id = None  # next segment id, computed on first allocation
+        self.graph = None  # links between the segments, built on first lookup
+        self.annotation_store = None  # annotations of the segments, as columns of codes, built on first lookup
+        self.text_index = None  # words of the segments, built on first search
+        self.symbols = SymbolTable()  # participants, layers, labels and qualifiers, stored once
+
+        self.generation = 0  # incremented by every modification
+        self.saved_generation = 0  # generation written by the last save
+        self.backup_generation = 0  # generation written by the last backup
+
+        self.source = None  # memory-mapped snapshot or database of lazily loaded segments
+        self.database = None  # database of the save file, for SQLite save files
+
+        self.init_journal()
+
+    def __getstate__(self):
+        """
+        Excludes the journal and pending changes from the snapshot
+        """
+        state = self.__dict__.copy()
+
+        for key in ["journal", "changes", "operations", "journaled_state", "journaled_taxonomy", "journaled_view", "saved_generation", "backup_generation", "source", "database", "segments_by_id", "graph", "annotation_store", "text_index", "symbols"]:
+            state.pop(key, None)
+
+        # collections are pickled as lists
+        state["full_collection"] = list(state.pop("_full_collection"))
+        state["collection"] = list(state.pop("_collection"))
+
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores a snapshot, including those saved before the journal existed
+        """
+        state.setdefault("journal_sequence", 0)
+        state.setdefault("generation", 0)
+        state.setdefault("next_id", None)
+
+        full_collection = state.pop("full_collection")
+        collection = state.pop("collection")
+
+        self.__dict__.update(state)
+
+        self.full_collection = full_collection
+        self.collection = collection
+
+        self.segments_by_id = None
+        self.graph = None
+        self.annotation_store = None
+        self.text_index = None
+        self.symbols = SymbolTable()
+
+        # a copy is not on disk, load paths mark restored snapshots as saved
+        self.saved_generation = self.backup_generation = None
+
+        self.source = None
+        self.database = None
+
+        self.init_journal()
+
+    @property
+    def full_collection(self):
+        """
+        Full collection of segments
+        """
+        return self._full_collection
+
+    @full_collection.setter
+    def full_collection(self, segments):
+        # positions of segments are indexed
+        self._full_collection = segments if isinstance(segments, BlockList) else BlockList(segments)
+
+    @property
+    def collection(self):
+        """
+        Current collection used, filtered or not
+        """
+        return self._collection
+
+    @collection.setter
+    def collection(self, segments):
+        self._collection = segments if isinstance(segments, BlockList) else BlockList(segments)
+
+    def init_journal(self):
+        """
+        Resets the change tracking used by the journal
+        """
+        self.journal = None  # journal of the save file, None until a snapshot is written
+        self.changes = OrderedDict()  # segments modified since the last save, by id
+        self.operations = []  # insertions and removals since the last save
+        self.journaled_state = None  # last state written to the journal
+        self.journaled_taxonomy = None  # last taxonomy written to the journal
+        self.journaled_view = self.collection  # last view written to the journal
+
+    def close_database(self):
+        """
+        Closes the database of the save file, so that the next save writes the whole collection instead of its changes
+        """
+        if self.database is not None:
+            self.database.close()
+            self.database = None
+
     ######################
     # NAVIGATION METHODS #
     ######################
@@ -453,6 +1205,50 @@ class SegmentCollection:
 
         self.display_range = first, last
 
+    def go_to(self, i):
+        """
+        Sets the index to a segment of the current collection
+        """
+        if i > self.i:
+            self.next(i - self.i)
+        else:
+            self.previous(self.i - i)
+
+    def locate(self, position, view=None):
+        """
+        Returns the index, in a view (the current collection by default), of the first segment at or after a position of
+        the full collection, or of the last segment if none follows, None if the view is empty
+        """
+        view = self.collection if view is None else view
+
+        if not view:
+            return None
+
+        # the positions of the segments of a view increase with their index, they are searched by bisection
+        low, high = 0, len(view) - 1
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.full_collection.index(view[middle]) < position:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def locate_segment(self, segment, view=None):
+        """
+        Returns the index of a segment of the full collection in a view (the current collection by default) or, if the view
+        does not include it, of the nearest segment following it, or preceding it if none follows, None if the view is empty
+        """
+        view = self.collection if view is None else view
+
+        if segment in view:
+            return view.index(segment)
+
+        return self.locate(self.full_collection.index(segment), view)
+
     ##################
     # ACCESS METHODS #
     ##################
@@ -489,19 +1285,244 @@ class SegmentCollection:
         """
         Return a tuple of segment indexes
         """
-        cs = None
-        for s in self.collection:
-            if s.id == segment.id:
-                cs = s
-                break
+        # the segment may be a copy from before an undo, the collection's segment with the same id is looked up
+        segment = self.get_segment(segment.id)
+
+        return (self.collection.index(segment), self.full_collection.index(segment))
+
+    def get_segment(self, identifier):
+        """
+        Returns the segment with the given id, None if there is none
+        """
+        return self.index_segments().get(identifier)
+
+    def index_segments(self):
+        """
+        Returns the segments by id, including removed segments that other segments may still link to
+        """
+        if self.segments_by_id is None:
+            self.segments_by_id = {segment.id: segment for segment in self.full_collection}
+
+        return self.segments_by_id
+
+    def allocate_id(self):
+        """
+        Returns a new segment id, greater than any id allocated before, including the numbers imported as strings
+        """
+        segments_by_id = self.index_segments()
+
+        if self.next_id is None:
+            self.next_id = max([number + 1 for number in map(parse_id, segments_by_id) if number is not None] + [0])
+
+        # ids are exported as strings, an id must not be written like another
+        while self.next_id in segments_by_id or str(self.next_id) in segments_by_id:
+            self.next_id += 1
+
+        identifier = self.next_id
+        self.next_id += 1
+
+        return identifier
+
+    def register(self, segment):
+        """
+        Indexes a segment added to the collection, allocating it an id if it has none
+        """
+        if segment.id is None:
+            segment.id = self.allocate_id()
+        elif self.next_id is not None:
+            number = parse_id(segment.id)
 
-        fcs = None
-        for s in self.full_collection:
-            if s.id == segment.id:
-                fcs = s
-                break
+            if number is not None and number >= self.next_id:
+                self.next_id = number + 1
 
-        return (self.collection.index(cs), self.full_collection.index(fcs))
+        if self.segments_by_id is not None:
+            self.segments_by_id[segment.id] = segment
+
+    def get_graph(self):
+        """
+        Returns the graph of the links between the segments of the full collection
+        """
+        if self.graph is None:
+            self.graph = LinkGraph()
+
+            for segment in self.full_collection:
+                for ls, lt in segment.links:
+                    self.graph.add(segment.id, ls.id, lt)
+
+        return self.graph
+
+    def get_link_sources(self, link_type):
+        """
+        Returns the segments with links of a type
+        """
+        return [self.get_segment(identifier) for identifier in self.get_graph().get_sources(link_type)]
+
+    def sync_links(self, segment):
+        """
+        Updates the graph with the outgoing links of a segment, which are dropped if it was removed
+        """
+        if self.graph is not None:
+            self.graph.set_links(segment.id, [(ls.id, lt) for ls, lt in segment.links] if segment in self.full_collection else [])
+
+    def get_annotation_store(self):
+        """
+        Returns the annotations of the segments of the full collection, as columns of codes
+        """
+        if self.annotation_store is None:
+            self.annotation_store = AnnotationStore(self.symbols)
+
+            for segment in self.full_collection:
+                self.annotation_store.set_row(segment.id, segment.annotations, segment.legacy)
+
+        return self.annotation_store
+
+    def sync_annotations(self, segment):
+        """
+        Updates the annotation store with the annotations of a segment, which are dropped if it was removed
+        """
+        if self.annotation_store is not None:
+            if segment in self.full_collection:
+                self.annotation_store.set_row(segment.id, segment.annotations, segment.legacy)
+            else:
+                self.annotation_store.remove_row(segment.id)
+
+    def select_segments(self, layer=None, annotation=False, qualifier=False, legacy=False):
+        """
+        Returns the bitmap of the segments with an annotation, in a layer or in any layer if none is given
+        """
+        store = self.get_annotation_store()
+        annotation_type = "qualifier" if qualifier else "label"
+
+        if layer is None:
+            return store.select_in_any_layer(annotation or None, annotation_type, legacy)
+
+        return store.select(layer, annotation_type, annotation or None, legacy)
+
+    def select_segments_with_layer(self, layer, legacy=False):
+        """
+        Returns the bitmap of the segments with a layer
+        """
+        return self.get_annotation_store().select_layer(layer, legacy)
+
+    def get_segments(self, bitmap):
+        """
+        Returns the segments of a bitmap, in the order of the full collection
+        """
+        return self.full_collection.select({self.get_segment(identifier) for identifier in self.get_annotation_store().get_ids(bitmap)})
+
+    def find_segments(self, layer=None, annotation=False, qualifier=False, legacy=False):
+        """
+        Returns the segments of the full collection with an annotation, in a layer or in any layer if none is given, in order
+        """
+        return self.get_segments(self.select_segments(layer, annotation, qualifier, legacy))
+
+    def find_segments_with_layer(self, layer, legacy=False):
+        """
+        Returns the segments of the full collection with a layer, in order
+        """
+        return self.get_segments(self.select_segments_with_layer(layer, legacy))
+
+    def compose_view(self, bitmap, operator=None):
+        """
+        Sets the current collection to the segments of a bitmap, combined with the current collection by an operator
+        ("and", "or" or "and not"), or replacing it if there is none
+        """
+        store = self.get_annotation_store()
+
+        if operator is not None:
+            view = store.select_ids(segment.id for segment in self.collection)
+
+            if operator == "and":
+                bitmap = view & bitmap
+            elif operator == "or":
+                bitmap = view | bitmap
+            elif operator == "and not":
+                bitmap = view - bitmap
+            else:
+                raise ValueError("unknown view operator: {}".format(operator))
+
+        self.collection = self.get_segments(bitmap)
+
+    def get_text_index(self):
+        """
+        Returns the words of the segments of the full collection
+        """
+        if self.text_index is None:
+            self.text_index = TextIndex()
+
+            for segment in self.full_collection:
+                self.text_index.set_document(segment.id, segment.raw, segment.participant)
+
+        return self.text_index
+
+    def sync_text(self, segment):
+        """
+        Updates the text index with the raw of a segment, which is dropped if it was removed
+        """
+        if self.text_index is not None:
+            if segment in self.full_collection:
+                self.text_index.set_document(segment.id, segment.raw, segment.participant)
+            else:
+                self.text_index.remove_document(segment.id)
+
+    def search(self, query):
+        """
+        Returns the segments of the full collection matching a query, in order
+        """
+        return self.full_collection.select({self.get_segment(identifier) for identifier in self.get_text_index().search(query)})
+
+    def select_text(self, query):
+        """
+        Returns the bitmap of the segments matching a query
+        """
+        return self.get_annotation_store().select_ids(self.get_text_index().search(query))
+
+    def find_hit(self, query, backward=False):
+        """
+        Returns the index, in the current collection, of the first segment matching a query after the active one, or of the
+        last one before it if backward, cycling through the collection, None if no segment of the collection matches
+        """
+        hits = set(self.get_text_index().search(query))
+        size = len(self.collection)
+
+        if not hits or not size:
+            return None
+
+        # segments are visited from the active one, which comes last, so that hits are found without sorting them
+        if backward:
+            segments = chain(islice(reversed(self.collection), size - self.i, None), islice(reversed(self.collection), size - self.i))
+        else:
+            segments = chain(islice(self.collection, self.i + 1, None), islice(self.collection, self.i + 1))
+
+        for n, segment in enumerate(segments, 1):
+            if segment.id in hits:
+                return (self.i - n if backward else self.i + n) % size
+
+        return None
+
+    def get_participants(self):
+        """
+        Returns the participants of the collection
+        """
+        if self.source is not None:
+            return self.source.get_participants()
+
+        return list(OrderedDict.fromkeys(segment.participant for segment in self.full_collection))
+
+    def get_legacy_layers(self):
+        """
+        Returns the legacy layers of the collection
+        """
+        if self.source is not None:
+            return self.source.get_legacy_layers()
+
+        return list(self.get_vocabulary(PRESENCE, legacy=True))
+
+    def get_vocabulary(self, annotation_type="label", legacy=False):
+        """
+        Returns the labels or qualifiers of the collection, or its layers if the type is PRESENCE, with their number of segments
+        """
+        return self.get_annotation_store().get_vocabulary(annotation_type, legacy)
 
     ########################
     # MODIFICATION METHODS #
@@ -516,30 +1537,113 @@ class SegmentCollection:
         del self.collection[ci]
         del self.full_collection[fi]
 
+        self.sync_links(segment)
+        self.sync_annotations(segment)
+        self.sync_text(segment)
+
+        self.operations.append(("remove", segment))
+        self.touch()
+
     def insert(self, i, fi, insert):
         """
-        Inserts a segment at a specific index
+        Inserts a segment at an index of the current collection and an index of the full collection
         """
         # insert into full collection
-        self.full_collection.insert(i, insert)
+        self.full_collection.insert(fi, insert)
 
         # insert into active collection
-        self.collection.insert(fi, insert)
+        self.collection.insert(i, insert)
+
+        self.register(insert)
+
+        self.operations.append(("insert", insert, fi, i))
+        self.touch(insert)
 
     def insert_after_active(self, insert):
         """
         Inserts a segment after the active one
         """
+        fi = self.full_collection.index(self.get_active()) + 1
+
         # insert into full collection
-        self.full_collection.insert(self.full_collection.index(self.get_active()) + 1, insert)
+        self.full_collection.insert(fi, insert)
 
         # insert into active collection
         self.collection.insert(self.i + 1, insert)
 
+        self.register(insert)
+
+        self.operations.append(("insert", insert, fi, self.i + 1))
+        self.touch(insert)
+
+    def merge_segments(self, segment, previous):
+        """
+        Merges a segment with the segment preceding it, which is removed, returns the state restored by unmerge_segments()
+        """
+        # a new copy is not linked to, the incoming links are copied explicitly
+        original = segment.copy(segment.raw)
+        original.linked = list(segment.linked)
+        original.legacy_linked = list(segment.legacy_linked)
+
+        # the segments linking to the previous segment are rewired to the merged segment
+        state = original, list(previous.linked), [(ls, list(ls.links)) for ls in OrderedDict.fromkeys(ls for ls, lt in previous.linked)]
+
+        segment.merge(previous)
+        self.touch(segment)
+
+        self.remove(previous)
+
+        return state
+
+    def unmerge_segments(self, segment, previous, state):
+        """
+        Splits a merged segment back into the two segments it was merged from
+        """
+        original, previous_linked, sources = state
+
+        i, fi = self.get_segment_indexes(segment)
+
+        self.remove(segment)
+
+        segment.copy(original)
+        previous.linked = previous_linked
+
+        for ls, links in sources:
+            ls.links = links
+
+        self.insert(i, fi, segment)
+        self.insert(i, fi, previous)
+
+        self.touch(*[ls for ls, links in sources])
+
+    def touch(self, *segments):
+        """
+        Marks the collection, and optionally some of its segments, as modified since the last save
+        """
+        self.generation += 1
+
+        for segment in segments:
+            segment.generation += 1
+
+            self.changes[segment.id] = segment
+            self.sync_links(segment)
+            self.sync_annotations(segment)
+            self.sync_text(segment)
+
+            # segments linking to this one may have had their links rewired
+            for ls, lt in segment.linked:
+                self.changes[ls.id] = ls
+                self.sync_links(ls)
+
     def legacy_to_annotations(self):
         """
         Creates a normal annotation for each legacy annotations
         """
+        # too many changes for the journal, a snapshot is required
+        self.journal = None
+        self.close_database()
+        self.touch()
+
         for segment in self.full_collection:
             for layer in segment.legacy:
                 if layer in self.labels.keys():
@@ -560,6 +1664,10 @@ class SegmentCollection:
                 if lt in self.links:
                     segment.create_link(ls, lt)
 
+        # segments are not touched one by one, the indexes are rebuilt on their next lookup
+        self.graph = None
+        self.annotation_store = None
+
     def has_valid_legacy(self):
         """
         Checks if the collection has valid legacy annotations
@@ -608,10 +1716,12 @@ class SegmentCollection:
             self.colors[new_layer] = self.colors[layer]
             del self.colors[layer]
 
-        for segment in self.full_collection:
-            if layer in segment.annotations:
-                segment.annotations[new_layer] = segment.annotations[layer]
-                del segment.annotations[layer]
+        self.touch()
+
+        for segment in self.find_segments_with_layer(layer):
+            segment.annotations[new_layer] = segment.annotations[layer]
+            del segment.annotations[layer]
+            self.touch(segment)
 
         return True
 
@@ -625,9 +1735,11 @@ class SegmentCollection:
         if new_label not in self.labels[layer]:
             self.labels[layer].insert(index, new_label)
 
-        for segment in self.full_collection:
-            if segment.has(layer, annotation=label):
-                segment.set(layer, new_label)
+        self.touch()
+
+        for segment in self.find_segments(layer, label):
+            segment.set(layer, new_label)
+            self.touch(segment)
 
     def change_qualifier(self, layer, qualifier, new_qualifier):
         """
@@ -639,9 +1751,11 @@ class SegmentCollection:
         if new_qualifier not in self.qualifiers[layer]:
             self.qualifiers[layer].insert(index, new_qualifier)
 
-        for segment in self.full_collection:
-            if segment.has(layer, annotation=qualifier, qualifier=True):
-                segment.set(layer, new_qualifier, qualifier=True)
+        self.touch()
+
+        for segment in self.find_segments(layer, qualifier, qualifier=True):
+            segment.set(layer, new_qualifier, qualifier=True)
+            self.touch(segment)
 
     def change_link_type(self, link_type, new_link_type):
         """
@@ -654,17 +1768,18 @@ class SegmentCollection:
         # remove old link type
         del self.links[link_type]
 
-        # replace in links and linked for all segment
-        for segment in self.full_collection:
-            for ls, lt in segment.links:
-                if lt == link_type:
-                    segment.links.remove((ls, lt))
-                    segment.links.append((ls, new_link_type))
+        self.touch()
 
-            for ls, lt in segment.linked:
-                if lt == link_type:
-                    segment.linked.remove((ls, lt))
-                    segment.linked.append((ls, new_link_type))
+        # replace in links and linked for the segments with links of this type
+        for segment in self.get_link_sources(link_type):
+            targets = [ls for ls, lt in segment.links if lt == link_type]
+
+            segment.links = [(ls, new_link_type if lt == link_type else lt) for ls, lt in segment.links]
+
+            for target in targets:
+                target.linked = [(ls, new_link_type if ls == segment and lt == link_type else lt) for ls, lt in target.linked]
+
+            self.touch(segment)
 
     def add_layer(self, layer):
         """
@@ -672,6 +1787,8 @@ class SegmentCollection:
         """
         self.labels[layer] = []
 
+        self.touch()
+
     def add_label(self, layer, label):
         """
         Adds a new label to the tagset
@@ -679,6 +1796,8 @@ class SegmentCollection:
         if label not in self.labels[layer]:
             self.labels[layer].append(label)
 
+        self.touch()
+
     def add_qualifier(self, layer, qualifier):
         """
         Adds a new qualifier to the tagset
@@ -689,6 +1808,8 @@ class SegmentCollection:
         if qualifier not in self.qualifiers[layer]:
             self.qualifiers[layer].append(qualifier)
 
+        self.touch()
+
     def add_link_type(self, link_type):
         """
         Adds a new link type to the tagset
@@ -696,6 +1817,8 @@ class SegmentCollection:
         if link_type not in self.links:
             self.links[link_type] = None
 
+        self.touch()
+
     def delete_layer(self, layer):
         """
         Deletes a layer
@@ -703,10 +1826,12 @@ class SegmentCollection:
         # remove the layer from the taxonomy
         del self.labels[layer]
 
+        self.touch()
+
         # remove the layer from all annotations
-        for segment in self.full_collection:
-            if layer in segment.annotations:
-                del segment.annotations[layer]
+        for segment in self.find_segments_with_layer(layer):
+            del segment.annotations[layer]
+            self.touch(segment)
 
         # changes the default layer if needed
         if layer == self.default_layer:
@@ -721,9 +1846,11 @@ class SegmentCollection:
         """
         self.labels[layer].remove(label)
 
-        for segment in self.full_collection:
-            if segment.has(layer, annotation=label):
-                segment.rem(layer)
+        self.touch()
+
+        for segment in self.find_segments(layer, label):
+            segment.rem(layer)
+            self.touch(segment)
 
     def delete_qualifier(self, layer, qualifier):
         """
@@ -731,9 +1858,11 @@ class SegmentCollection:
         """
         self.qualifiers[layer].remove(qualifier)
 
-        for segment in self.full_collection:
-            if segment.has(layer, annotation=qualifier, qualifier=True):
-                segment.rem(layer, qualifier=True)
+        self.touch()
+
+        for segment in self.find_segments(layer, qualifier, qualifier=True):
+            segment.rem(layer, qualifier=True)
+            self.touch(segment)
 
     def delete_link_type(self, link_type):
         """
@@ -742,15 +1871,18 @@ class SegmentCollection:
         # remove old link type
         del self.links[link_type]
 
-        # replace in links and linked for all segment
-        for segment in self.full_collection:
-            for ls, lt in segment.links:
-                if lt == link_type:
-                    segment.links.remove((ls, lt))
+        self.touch()
 
-            for ls, lt in segment.linked:
-                if lt == link_type:
-                    segment.linked.remove((ls, lt))
+        # remove from links and linked for the segments with links of this type
+        for segment in self.get_link_sources(link_type):
+            targets = [ls for ls, lt in segment.links if lt == link_type]
+
+            segment.links = [(ls, lt) for ls, lt in segment.links if lt != link_type]
+
+            for target in targets:
+                target.linked = [(ls, lt) for ls, lt in target.linked if ls != segment or lt != link_type]
+
+            self.touch(segment)
 
     ##################################
     # TAXONOMY IMPORT/EXPORT METHODS #
@@ -771,17 +1903,32 @@ class SegmentCollection:
             self.qualifiers = taxonomy["qualifiers"]  # label qualifier tagsets
             self.colors = taxonomy["colors"]  # layer colors
             self.links = taxonomy["links"]  # link types
+
+            self.intern_taxonomy()
+            self.touch()
         except Exception:
             logging.exception("DialogueActCollection.import_taxonomy()")
             return False
 
         return True
 
-    def export_taxonomy(self, path):
+    def intern_taxonomy(self):
         """
-        Exports the collection's taxonomy to a JSON file
+        Replaces the layers, labels and qualifiers of the taxonomy by their interned symbols
+        """
+        intern = self.symbols.intern
+
+        self.labels = OrderedDict((intern(layer), [intern(label) for label in labels]) for layer, labels in self.labels.items())
+        self.qualifiers = OrderedDict((intern(layer), [intern(qualifier) for qualifier in qualifiers]) for layer, qualifiers in self.qualifiers.items())
+
+        self.layer = intern(self.layer)
+        self.default_layer = intern(self.default_layer)
+
+    def get_taxonomy(self):
         """
-        taxonomy = {
+        Returns a dict representation of the collection's taxonomy
+        """
+        return {
             "name": self.taxonomy,
             "default": self.default_layer,
             "colors": self.colors,
@@ -790,6 +1937,12 @@ class SegmentCollection:
             "links": self.links
         }
 
+    def export_taxonomy(self, path):
+        """
+        Exports the collection's taxonomy to a JSON file
+        """
+        taxonomy = self.get_taxonomy()
+
         try:
             with open(path, "w") as f:
                 json.dump(taxonomy, f, indent=4, ensure_ascii=False)
@@ -812,10 +1965,22 @@ class SegmentCollection:
         full_collection = self.full_collection
 
         try:
-            if path.endswith("json"):
-                self.full_collection = self.import_collection_from_json(path)
+            if compression.strip_extension(path).endswith("json"):
+                self.full_collection, segments_by_id = self.import_collection_from_json(path)
             else:
-                self.full_collection = self.import_collection_from_csv(path)
+                self.full_collection, segments_by_id = self.import_collection_from_csv(path)
+
+            # the index built to resolve links is kept
+            self.segments_by_id = segments_by_id
+            self.next_id = None
+            self.graph = None
+            self.annotation_store = None
+            self.text_index = None
+
+            # segments imported without an id are numbered after the imported ids
+            for segment in self.full_collection:
+                if segment.id is None:
+                    self.register(segment)
 
             # syncs the current collection to the full collection
             self.collection = self.full_collection.copy()
@@ -823,6 +1988,12 @@ class SegmentCollection:
             # resets the index
             self.i = 0
 
+            # a new collection requires a snapshot
+            self.source = None
+            self.init_journal()
+            self.close_database()
+            self.touch()
+
             # writes save path to /tmp
             self.write_save_path_to_tmp()
         except Exception:
@@ -843,24 +2014,26 @@ class SegmentCollection:
         Imports a new collection from a JSON file
         """
         # JSON data
-        with codecs.open(path, encoding="utf-8") as f:
+        with compression.open_read(path, "rt", encoding="utf-8") as f:
             data = json.loads(f.read())
 
         collection = []
         segments_by_id = {}
+        texts = {}  # message raws, stored once
+        dates = {}  # datetimes, by string
 
         for dic in data:
             # create segment
             segment = Segment(
                 dic["segment"],
-                dic["participant"],
-                parser.parse(dic["datetime"])
+                self.symbols.intern(dic["participant"]),
+                parse_datetime(dic["datetime"], dates)
             )
 
-            segment.raw = dic["raw"]
+            segment.raw = texts.setdefault(dic["raw"], dic["raw"])
 
             segment.id = dic["id"]
-            segment.legacy = dic["annotations"]
+            segment.legacy = self.symbols.intern_annotations(dic["annotations"])
             segment.note = dic["note"]
 
             for lt, ids in dic["links"].items():
@@ -877,7 +2050,7 @@ class SegmentCollection:
             # adds the segment to the full collection
             collection.append(segment)
 
-        return collection
+        return collection, segments_by_id
 
     def import_collection_from_csv(self, path):
         """
@@ -885,10 +2058,12 @@ class SegmentCollection:
         """
         collection = []
 
-        with open(path) as f:
+        with compression.open_read(path, "rt") as f:
             rows = [{k: v for k, v in row.items()} for row in csv.DictReader(f, skipinitialspace=True, delimiter="\t", quoting=csv.QUOTE_NONE)]
 
         segments_by_id = {}
+        texts = {}  # message raws, stored once
+        dates = {}  # datetimes, by string
         previous_segment = None
         segment = None
 
@@ -915,8 +2090,6 @@ class SegmentCollection:
 
                 segment.original_raw = previous_segment.original_raw
 
-                tokenizer = WhitespaceTokenizer()
-
                 # last token of the previous segment's segment
                 end_of_previous_span = tokenizer.tokenize(previous_segment.span)[-1]
                 # position of the last token of the previous segment's segment in the full raw
@@ -927,13 +2100,10 @@ class SegmentCollection:
 
                 # adjust the raw of the previous segment
                 previous_segment.raw = previous_segment.raw[:index].strip()
-
-                # update tokens of the previous segment
-                previous_segment.tokenize()
             else:
-                dt = parser.parse(row["datetime"]) if row["datetime"] is not None and row["datetime"].strip() != "" else previous_segment.datetime
-                raw = row["raw"].strip()
-                participant = row["participant"].strip() if row["participant"].strip() != "\\" else segment.participant
+                dt = parse_datetime(row["datetime"], dates) if row["datetime"] is not None and row["datetime"].strip() != "" else previous_segment.datetime
+                raw = texts.setdefault(row["raw"].strip(), row["raw"].strip())
+                participant = self.symbols.intern(row["participant"].strip()) if row["participant"].strip() != "\\" else segment.participant
 
                 segment = Segment(
                     raw,
@@ -947,9 +2117,6 @@ class SegmentCollection:
             # update the current segment's segment
             segment.span = span
 
-            # update the current segment's tokens
-            segment.tokenize()
-
             # set the current segment as the previous segment (for the next iteration)
             previous_segment = segment
 
@@ -961,10 +2128,10 @@ class SegmentCollection:
                         layer = key[:len(key) - len("-value")]
 
                         # adding qualifier
-                        segment.set(layer, row[key], qualifier=True, legacy=True)
+                        segment.set(self.symbols.intern(layer), self.symbols.intern(row[key]), qualifier=True, legacy=True)
                     else:
                         # adding label
-                        segment.set(key, row[key], legacy=True)
+                        segment.set(self.symbols.intern(key), self.symbols.intern(row[key]), legacy=True)
 
             # link extraction
             if "links" in row and row["links"] != "":
@@ -980,25 +2147,30 @@ class SegmentCollection:
             # set note
             segment.note = row["note"].strip() if "note" in row and row["note"].strip() else None
 
-            # makes sure all ids are unique
-            if segment.id in segments_by_id:
-                raise Exception
+            # segments without an id are numbered once all ids are known
+            if segment.id is not None:
+                # makes sure all ids are unique
+                if segment.id in segments_by_id:
+                    raise Exception
 
-            segments_by_id[segment.id] = segment
+                segments_by_id[segment.id] = segment
 
             # adds the segment to the full collection
             collection.append(segment)
 
-        return collection
+        return collection, segments_by_id
 
     def export_collection(self, path):
         """
         Exports the collection to the filesystem
         """
         try:
-            if path.endswith(".json"):
+            # exports are compressed when their extension is followed by a compression extension
+            extension = os.path.splitext(compression.strip_extension(path))[1]
+
+            if extension == ".json":
                 self.export_collection_as_json(path)
-            elif path.endswith(".csv"):
+            elif extension == ".csv":
                 self.export_collection_as_csv(path)
         except Exception:
             logging.exception("DialogueActCollection.export_collection()")
@@ -1013,7 +2185,7 @@ class SegmentCollection:
         data = [segment.to_json_dict() for segment in self.full_collection]
 
         try:
-            with open(path, "w") as f:
+            with compression.open_write(path, "w", compression.from_extension(path)) as f:
                 json.dump(data, f, indent=4, ensure_ascii=False)
         except Exception:
             logging.exception("")
@@ -1025,14 +2197,9 @@ class SegmentCollection:
         """
         Exports the collection in CSV format
         """
-        legacy_layers = []
-
-        for segment in self.full_collection:
-            for layer in segment.legacy.keys():
-                if layer not in legacy_layers:
-                    legacy_layers.append(layer)
+        legacy_layers = self.get_legacy_layers()
 
-        with open(path, "w") as f:
+        with compression.open_write(path, "w", compression.from_extension(path)) as f:
             w = csv.DictWriter(f, self.full_collection[0].to_csv_dict(self.labels, legacy_layers).keys(), delimiter="\t")
             w.writeheader()
 
@@ -1051,25 +2218,581 @@ class SegmentCollection:
     # SAVE MANAGEMENT METHODS #
     ###########################
 
-    def save(self, path=None, backup=False):
+    def save(self, path=None):
         """
         Serializes the SegmentCollection and writes it to the filesystem
         """
+        try:
+            task = self.prepare_save(path=path)
+
+            if task is False:
+                return False
+
+            if task is not None:
+                task()
+        except Exception:
+            logging.exception("DialogueActCollection.save()")
+            return False
+
+        return True
+
+    def prepare_save(self, path=None):
+        """
+        Captures the state to be saved and returns a task writing it, which can run on another thread
+        """
         if self.layer is None:
             return False
 
-        try:
-            with open(path if path is not None else self.save_file, "wb") as f:
-                pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+        # changes lost by a failed write are only recovered by writing the whole collection
+        if self.journal is not None and self.journal.failed:
+            self.journal = None
+
+        if self.database is not None and self.database.failed:
+            self.close_database()
+
+        if path is None and self.database is not None:
+            # autosave, changes are applied to the database in a single transaction
+            if not self.is_modified():
+                return None
+
+            database, records = self.database, self.collect_changes()
+
+            return self.save_task(database, lambda: database.apply(records))
+
+        if path is None and self.journal is not None:
+            # autosave, nothing is written unless the collection changed
+            if not self.is_modified():
+                return None
+
+            # only changes are appended to the journal
+            journal, records = self.journal, self.journal.stamp(self.collect_changes())
+
+            def append():
+                journal.append(records)
+
+                if journal.is_full():
+                    SegmentCollection.compact(journal.save_path, journal)
+
+            return self.save_task(journal, append)
+
+        # the collection only moves to another save file once it is written
+        save_file = os.path.abspath(path) if path else self.save_file
+
+        previous, self.database = self.database, None
+
+        if save_file.endswith(Database.extension):
+            # segments still read from the file are decoded before it is replaced
+            if isinstance(self.source, DatabaseSource) and self.source.path == save_file:
+                self.source.release()
+                self.source = None
+
+            self.journal = None
+            self.collect_changes()  # pending changes are included in the records
+
+            capture = self.capture(save_file)
+            database = self.database = Database(save_file)
+
+            def write():
+                if previous is not None:
+                    previous.close()
+
+                Database.write(database.path, capture.to_records())
+
+            return self.save_task(database, write, save_file)
+
+        if self.journal is None or self.journal.save_path != save_file:
+            # records left by another collection must not be replayed on this snapshot
+            self.journal = Journal(save_file, self.journal_sequence)
+            obsolete = True
+        else:
+            obsolete = False
+
+        journal = self.journal
+
+        self.collect_changes()  # pending changes are included in the snapshot
+        self.journal_sequence = journal.sequence
+
+        capture = self.capture(save_file)
+
+        def snapshot():
+            if previous is not None:
+                previous.close()
+
+            if obsolete:
+                journal.clear()
+
+            # later changes are journaled, and replayed on top of the snapshot
+            SegmentCollection.write_snapshot(journal.save_path, capture.serialize(journal.save_path))
+            journal.clear()
+
+        return self.save_task(journal, snapshot, save_file)
+
+    def save_task(self, target, write, save_file=None):
+        """
+        Returns a task running a write to a journal or database, then marking the collection as saved up to its current
+        generation, in another save file if one is given; a failed write leaves the collection modified, and fails the
+        writes queued after it to the same target
+        """
+        generation = self.generation
+
+        def task():
+            if target.failed:
+                raise IOError("a previous write to {} failed".format(target.path))
 
-            if path and not backup:
-                self.save_file = os.path.abspath(path)
+            try:
+                write()
+            except Exception:
+                target.failed = True
+                raise
+
+            if save_file is not None and save_file != self.save_file:
+                self.save_file = save_file
                 self.write_save_path_to_tmp()
+
+            self.saved_generation = generation
+
+        return task
+
+    def capture(self, save_file):
+        """
+        Returns a copy of the collection, to be serialized in a save file on another thread: segments and the taxonomy are
+        copied, so that later modifications do not reach it, segments not decoded yet being decoded by the copy
+        """
+        capture = SegmentCollection.__new__(SegmentCollection)
+        capture.__dict__.update(self.__dict__)
+        capture.save_file = save_file
+
+        source = CaptureSource()
+
+        for segment in self.full_collection:
+            source.copies[segment] = segment.snapshot(source)
+
+        # links of lazy copies are redirected once decoded
+        for copy in source.copies.values():
+            if not isinstance(copy, LazySegment) or "links" not in copy._lazy[2]:
+                source.redirect(copy)
+
+        # plain lists are copied faster than block lists, and the collection is the full one when no filter is set
+        capture._full_collection = [source.copies[segment] for segment in self.full_collection]
+        capture._collection = [source.copies[segment] for segment in self.collection] if self.filter else capture._full_collection
+
+        for name in ["labels", "qualifiers", "colors", "links"]:
+            setattr(capture, name, deepcopy(getattr(self, name)))
+
+        return capture
+
+    def prepare_backup(self, store):
+        """
+        Captures the state to be backed up and returns a task writing it as a new backup point
+        """
+        if self.layer is None:
+            return False
+
+        header = {
+            "save_file": self.save_file,
+            "journal_sequence": self.journal_sequence,
+            "taxonomy": deepcopy(self.get_taxonomy()),
+            "state": {
+                "op": "state",
+                "i": self.i,
+                "layer": self.layer,
+                "filter": self.filter,
+                "next_id": self.next_id,
+                "view": [segment.id for segment in self.collection] if self.filter else None
+            }
+        }
+
+        task = store.prepare(self.full_collection, header)
+        self.backup_generation = self.generation
+
+        return task
+
+    @staticmethod
+    def restore_backup(path):
+        """
+        Rebuilds the collection of a backup point
+        """
+        try:
+            manifest, records = BackupStore.read(path)
+
+            sc = SegmentCollection()
+
+            # segments are created first, then their links are restored once all of them exist
+            sc.replay(
+                [{"op": "insert", "segment": record, "full_index": n, "view_index": n} for n, record in enumerate(records)] +
+                [{"op": "segment", "segment": record} for record in records if record["links"] or record["legacy_links"]] +
+                [{"op": "taxonomy", "taxonomy": manifest["taxonomy"]}, manifest["state"]]
+            )
+
+            sc.save_file = manifest["save_file"]
+            sc.journal_sequence = manifest["journal_sequence"]
+
+            # the restored collection replaces the save file on the next save
+            sc.touch()
+
+            sc.write_save_path_to_tmp()
+            sc.display_range = sc.i, min(len(sc.collection) - 1, sc.i + 50)
+
+            return sc
         except Exception:
-            logging.exception("DialogueActCollection.save()")
+            logging.exception("DialogueActCollection.restore_backup()")
             return False
 
-        return True
+    def is_modified(self, backup=False):
+        """
+        Checks if the collection changed since the last save or backup
+        """
+        return self.generation != (self.backup_generation if backup else self.saved_generation)
+
+    @staticmethod
+    def write_snapshot(path, data):
+        """
+        Writes a serialized snapshot of the collection, given as a list of chunks of bytes
+        """
+        temp_path = "{}.part".format(path)
+
+        # chunks are compressed as they are written
+        with compression.open_write(temp_path, "wb", compression.from_extension(path) or compression.default_codec()) as f:
+            for chunk in data:
+                f.write(chunk)
+
+        # the previous snapshot is only replaced once the new one is complete
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def compact(path, journal):
+        """
+        Replays the journal on a copy of the snapshot and writes the result, without touching the live collection
+        """
+        sc = SegmentCollection.read_snapshot(path)
+
+        # only the records already written are included, queued ones are appended afterwards
+        reader = Journal(path, sc.journal_sequence)
+        sc.replay(reader.read())
+        sc.journal_sequence = reader.sequence
+
+        SegmentCollection.write_snapshot(path, sc.serialize(path))
+        journal.clear()
+
+    def serialize(self, path):
+        """
+        Returns a snapshot of the collection as a list of chunks of bytes, in the format matching the path's extension
+        """
+        if compression.strip_extension(path).endswith(".pic"):
+            return [pickle.dumps(self, pickle.HIGHEST_PROTOCOL)]
+
+        return dia.iterdump(self.to_dia())
+
+    @staticmethod
+    def read_snapshot(path, lazy=False):
+        """
+        Reads a snapshot in either .dia or legacy pickle format, .dia files being memory-mapped if lazy
+        """
+        if is_database(path):
+            return SegmentCollection.from_database(path, lazy=lazy)
+
+        if dia.is_dia(path):
+            if lazy:
+                return SegmentCollection.from_dia(dia.map_file(path), lazy=True)
+
+            with open(path, "rb") as f:
+                return SegmentCollection.from_dia(f.read())
+
+        # compressed snapshots are decompressed in memory, as they cannot be memory-mapped
+        with compression.open_read(path) as f:
+            if f.peek(len(dia.MAGIC))[:len(dia.MAGIC)] == dia.MAGIC:
+                return SegmentCollection.from_dia(f.read(), lazy=lazy)
+
+            sc = pickle.load(f)
+
+        # a restored snapshot is already on disk
+        sc.saved_generation = sc.backup_generation = sc.generation
+
+        return sc
+
+    def to_dia(self):
+        """
+        Returns the sections of the collection in .dia format
+        """
+        segments = self.full_collection
+        indexes = {id(segment): i for i, segment in enumerate(segments)}
+
+        # symbol tables
+        participants = OrderedDict()
+        values = OrderedDict()
+        link_types = OrderedDict()
+
+        intern = lambda table, value: table.setdefault(value, len(table))
+
+        # annotations, as one array of value codes per layer, legacy flag and annotation type
+        columns = OrderedDict()
+
+        for i, segment in enumerate(segments):
+            for legacy, dic in enumerate([segment.annotations, segment.legacy]):
+                for layer, annotation in dic.items():
+                    for annotation_type, value in annotation.items():
+                        key = (legacy, layer, annotation_type)
+
+                        if key not in columns:
+                            columns[key] = array("I", bytes(4 * len(segments)))
+
+                        columns[key][i] = intern(values, value) + 1  # 0 stands for no annotation
+
+        # links, as edge lists of (source, target, type) triples
+        edges = [array("I"), array("I")]
+
+        for i, segment in enumerate(segments):
+            for legacy, links in enumerate([segment.links, segment.legacy_links]):
+                for ls, lt in links:
+                    # links towards removed segments are not saved
+                    if id(ls) in indexes:
+                        edges[legacy].extend([i, indexes[id(ls)], intern(link_types, lt)])
+
+        merged = [not isinstance(segment.original_raw, str) for segment in segments]
+
+        sections = OrderedDict()
+
+        sections["IDS "] = dia.pack_strings([json.dumps(segment.id) for segment in segments])
+        sections["RAW "] = dia.pack_strings([segment.raw for segment in segments])
+        sections["ORIG"] = dia.pack_strings([
+            # original raws are only stored when they differ from the raw
+            MERGE_SYMBOL.join(segment.original_raw) if merged[i] else None if segment.original_raw == segment.raw else segment.original_raw
+            for i, segment in enumerate(segments)
+        ])
+        sections["MRGD"] = bytes(merged)
+        sections["NOTE"] = dia.pack_strings([segment.note for segment in segments])
+        sections["PART"] = dia.pack_array("I", [intern(participants, segment.participant) for segment in segments])
+        sections["TIME"] = dia.pack_array("q", [segment.timestamp for segment in segments])
+        sections["ANNO"] = b"".join(dia.pack_array("I", column) for column in columns.values())
+        sections["LINK"] = dia.pack_array("I", edges[0])
+        sections["LLNK"] = dia.pack_array("I", edges[1])
+
+        if self.filter:
+            sections["VIEW"] = dia.pack_array("I", [indexes[id(segment)] for segment in self.collection])
+
+        # collection state and symbol tables
+        meta = {
+            "taxonomy": self.get_taxonomy(),
+            "i": self.i,
+            "layer": self.layer,
+            "filter": self.filter,
+            "save_file": self.save_file,
+            "journal_sequence": self.journal_sequence,
+            "generation": self.generation,
+            "next_id": self.next_id,
+            "participants": list(participants),
+            "values": list(values),
+            "link_types": list(link_types),
+            "annotations": [list(key) for key in columns]
+        }
+
+        sections["META"] = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+
+        return sections
+
+    @staticmethod
+    def from_dia(data, lazy=False):
+        """
+        Creates a collection from .dia data, segments being decoded on access if lazy
+        """
+        sections = dia.loads(data)
+
+        meta = json.loads(bytes(sections["META"]).decode("utf-8"))
+
+        sc = SegmentCollection()
+
+        source = SnapshotSource(sections, meta, sc.symbols)
+        segments = source.segments.copy()
+
+        if not lazy:
+            for segment in segments:
+                segment.materialize()
+
+        taxonomy = meta["taxonomy"]
+
+        sc.taxonomy = taxonomy["name"]
+        sc.default_layer = taxonomy["default"]
+        sc.colors = taxonomy["colors"]
+        sc.labels = taxonomy["labels"]
+        sc.qualifiers = taxonomy["qualifiers"]
+        sc.links = taxonomy["links"]
+
+        sc.full_collection = segments
+        sc.collection = [segments[i] for i in dia.unpack_array("I", sections["VIEW"])] if "VIEW" in sections else segments.copy()
+
+        sc.i = meta["i"]
+        sc.layer = meta["layer"]
+        sc.filter = meta["filter"]
+
+        sc.intern_taxonomy()
+        sc.save_file = meta["save_file"]
+        sc.journal_sequence = meta["journal_sequence"]
+        sc.generation = sc.saved_generation = sc.backup_generation = meta["generation"]
+        sc.next_id = meta.get("next_id")
+
+        sc.source = source if lazy else None
+
+        sc.init_journal()
+
+        return sc
+
+    def to_records(self):
+        """
+        Returns records recreating the whole collection
+        """
+        records = [
+            {"op": "insert", "segment": segment.to_record(), "full_index": n, "view_index": n}
+            for n, segment in enumerate(self.full_collection)
+        ]
+
+        records.append({"op": "taxonomy", "taxonomy": deepcopy(self.get_taxonomy())})
+        records.append({
+            "op": "state",
+            "i": self.i,
+            "layer": self.layer,
+            "filter": self.filter,
+            "next_id": self.next_id,
+            "view": [segment.id for segment in self.collection] if self.filter else None
+        })
+
+        return records
+
+    @staticmethod
+    def from_database(path, lazy=False):
+        """
+        Creates a collection from a SQLite save file, segments being decoded on access if lazy
+        """
+        sc = SegmentCollection()
+
+        source = DatabaseSource(path, sc.symbols)
+
+        sc.full_collection = source.segments.copy()
+        sc.collection = sc.full_collection.copy()
+
+        sc.replay([{"op": "taxonomy", "taxonomy": source.taxonomy}, dict(source.state, op="state")])
+
+        sc.save_file = os.path.abspath(path)
+        sc.database = Database(sc.save_file)
+
+        if lazy:
+            sc.source = source
+        else:
+            source.release()
+
+        sc.init_journal()
+
+        # the database is already up to date
+        sc.saved_generation = sc.backup_generation = sc.generation
+
+        return sc
+
+    def collect_changes(self):
+        """
+        Returns journal records for the changes made since the last save
+        """
+        records = []
+
+        for operation in self.operations:
+            if operation[0] == "insert":
+                op, segment, fi, ci = operation
+                records.append({"op": "insert", "segment": segment.to_record(), "full_index": fi, "view_index": ci})
+            else:
+                op, segment = operation
+                records.append({"op": "remove", "id": segment.id})
+
+        taxonomy = self.get_taxonomy()
+
+        if taxonomy != self.journaled_taxonomy:
+            self.journaled_taxonomy = deepcopy(taxonomy)
+            records.append({"op": "taxonomy", "taxonomy": deepcopy(taxonomy)})
+
+        for segment in self.changes.values():
+            records.append({"op": "segment", "segment": segment.to_record()})
+
+        state = {
+            "op": "state",
+            "i": self.i,
+            "layer": self.layer,
+            "filter": self.filter,
+            "next_id": self.next_id
+        }
+
+        # view changes are logged as the list of ids of the filtered collection
+        if self.collection is not self.journaled_view:
+            state["view"] = [segment.id for segment in self.collection] if self.filter else None
+            self.journaled_view = self.collection
+
+        if records or state != self.journaled_state:
+            records.append(state)
+            self.journaled_state = state
+
+        self.changes = OrderedDict()
+        self.operations = []
+
+        return records
+
+    def replay(self, records):
+        """
+        Applies journal records on top of the snapshot
+        """
+        for record in records:
+            if record["op"] == "insert":
+                segment = self.get_segment(record["segment"]["id"])
+
+                if segment is None:
+                    segment = Segment.from_record(record["segment"])
+
+                self.register(segment)
+
+                segment.restore(record["segment"], self.segments_by_id)
+
+                self.full_collection.insert(record["full_index"], segment)
+                self.collection.insert(record["view_index"], segment)
+            elif record["op"] == "remove":
+                segment = self.get_segment(record["id"])
+
+                self.full_collection.remove(segment)
+
+                if segment in self.collection:
+                    self.collection.remove(segment)
+            elif record["op"] == "segment":
+                segment = self.get_segment(record["segment"]["id"])
+
+                if segment is not None:
+                    segment.restore(record["segment"], self.segments_by_id)
+            elif record["op"] == "taxonomy":
+                taxonomy = record["taxonomy"]
+
+                self.taxonomy = taxonomy["name"]
+                self.default_layer = taxonomy["default"]
+                self.colors = taxonomy["colors"]
+                self.labels = taxonomy["labels"]
+                self.qualifiers = taxonomy["qualifiers"]
+                self.links = taxonomy["links"]
+
+                self.intern_taxonomy()
+            elif record["op"] == "state":
+                self.i = record["i"]
+                self.layer = record["layer"]
+                self.filter = record["filter"]
+                self.next_id = record.get("next_id", self.next_id)
+
+                if "view" in record:
+                    if record["view"] is None:
+                        self.collection = self.full_collection.copy()
+                    else:
+                        # segments removed since the view was written are left out
+                        self.collection = [segment for segment in map(self.get_segment, record["view"]) if segment is not None and segment in self.full_collection]
+
+                # the index may point past the end of a view which lost segments
+                self.i = max(0, min(self.i, len(self.collection) - 1))
+
+        # records rewire links, annotations and raws, the indexes are rebuilt on their next lookup
+        self.graph = None
+        self.annotation_store = None
+        self.text_index = None
+
+        self.journaled_view = self.collection
 
     def write_save_path_to_tmp(self):
         """
@@ -1126,14 +2849,79 @@ class SegmentCollection:
         Loads a serialized SegmentCollection
         """
         try:
-            with open(path, "rb") as f:
-                sc = pickle.load(f)
-                sc.write_save_path_to_tmp()
-                sc.display_range = sc.i, min(len(sc.collection) - 1, sc.i + 50)
+            sc = SegmentCollection.read_snapshot(path, lazy=True)
+
+            # databases are written in place, other snapshots are followed by a journal
+            if sc.database is None:
+                # applies the changes journaled since the snapshot
+                journal = Journal(path, sc.journal_sequence)
+                sc.replay(journal.read())
+
+                # the journal is only kept if it belongs to the save file and is intact
+                if os.path.abspath(path) == sc.save_file and not journal.torn:
+                    sc.journal = journal
+
+            sc.journaled_state = None
+            sc.journaled_taxonomy = deepcopy(sc.get_taxonomy())
+
+            sc.write_save_path_to_tmp()
+            sc.display_range = sc.i, min(len(sc.collection) - 1, sc.i + 50)
 
-                return sc
+            # only the displayed segments are decoded upfront
+            for segment in sc.collection[sc.display_range[0]:sc.display_range[1] + 1]:
+                if isinstance(segment, LazySegment):
+                    segment.materialize()
+
+            return sc
         except Exception:
             logging.exception("DialogueActCollection.load()")
             return False
 
         return False
+
+
+def to_timestamp(dt):
+    """
+    Converts a datetime to microseconds since the epoch, aware datetimes being converted to UTC
+    """
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return (dt - EPOCH) // timedelta(microseconds=1)
+
+
+def from_timestamp(timestamp):
+    """
+    Converts microseconds since the epoch to a datetime
+    """
+    return EPOCH + timedelta(microseconds=timestamp)
+
+
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp, date_format):
+    """
+    Formats microseconds since the epoch, the strings of the last timestamps being cached
+    """
+    return from_timestamp(timestamp).strftime(date_format)
+
+
+def parse_id(identifier):
+    """
+    Returns the number of a segment id, which may be imported as a string, None if it is not a number
+    """
+    try:
+        return int(identifier)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_datetime(string, dates):
+    """
+    Parses a datetime string, looking it up first in a dict of the strings parsed before
+    """
+    dt = dates.get(string)
+
+    if dt is None:
+        dt = dates[string] = parser.parse(string)
+
+    return dt
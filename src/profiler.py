@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Startup profiling
+"""
+
+import sys
+
+from time import perf_counter
+
+
+class StartupProfiler:
+    """
+    Records the duration of the startup stages, when enabled
+    """
+    def __init__(self, enabled=False, start=None):
+        """
+        Initializes the profiler, start being the launch time
+        """
+        self.enabled = enabled
+        self.start = self.last = start if start is not None else perf_counter()
+        self.stages = []  # (stage, duration, elapsed since launch) tuples
+        self.reported = False
+
+    def mark(self, stage):
+        """
+        Records the end of a stage
+        """
+        if not self.enabled:
+            return
+
+        now = perf_counter()
+
+        self.stages.append((stage, now - self.last, now - self.start))
+        self.last = now
+
+    def report(self):
+        """
+        Prints the duration of each stage, once
+        """
+        if not self.enabled or self.reported:
+            return
+
+        for stage, duration, elapsed in self.stages:
+            print("{:<24} {:>8.3f}s {:>8.3f}s".format(stage, duration, elapsed), file=sys.stderr)
+
+        self.reported = True
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Symbol table
+
+Participants, layers, labels and qualifiers repeated across segments, stored once and numbered, so that they are compared
+by identity and can be handled as small integers.
+"""
+
+
+class SymbolTable:
+    """
+    Distinct symbols of a collection, by id, 0 standing for no symbol
+    """
+    def __init__(self):
+        """
+        Initializes an empty table
+        """
+        self.symbols = [None]  # symbols, by id
+        self.ids = {}  # ids, by symbol
+
+    def __len__(self):
+        return len(self.symbols) - 1
+
+    def __contains__(self, symbol):
+        return symbol in self.ids
+
+    def __getitem__(self, identifier):
+        return self.symbols[identifier]
+
+    def code(self, symbol):
+        """
+        Returns the id of a symbol, adding it to the table if needed, 0 for None
+        """
+        if symbol is None:
+            return 0
+
+        identifier = self.ids.get(symbol)
+
+        if identifier is None:
+            identifier = self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+
+        return identifier
+
+    def lookup(self, symbol):
+        """
+        Returns the id of a symbol, None if it is not in the table
+        """
+        return 0 if symbol is None else self.ids.get(symbol)
+
+    def intern(self, symbol):
+        """
+        Returns the stored symbol equal to a symbol, storing it if needed
+        """
+        return self.symbols[self.code(symbol)]
+
+    def intern_annotations(self, annotations):
+        """
+        Returns a copy of a dict of annotations by layer, with interned layers, annotation types and values
+        """
+        return {
+            self.intern(layer): {self.intern(annotation_type): self.intern(value) for annotation_type, value in annotation.items()}
+            for layer, annotation in annotations.items()
+        }
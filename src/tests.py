@@ -11,11 +11,35 @@
 Unit test suite
 """
 
+import json
+import os
+import pickle
+import random
+import tempfile
+
 from unittest import main, TestCase
 
+import annotationstore
+import bitmap
 import colors
+import compression
+import dia
+import textindex
 
+from annotationstore import AnnotationStore
+from backup import BackupStore
+from bitmap import Bitmap
+from blocklist import BlockList
+from collections import OrderedDict
+from copy import deepcopy
+from database import Database, is_database
+from datetime import datetime, timedelta
+from journal import Journal
+from linkgraph import LinkGraph
+from model import LazySegment, Segment, SegmentCollection
 from strings import Strings
+from symbols import SymbolTable
+from textindex import TextIndex
 
 
 class TestColors(TestCase):
@@ -51,5 +75,864 @@ class TestStrings(TestCase):
         self.assertEqual(self.strings.get("test_key", "X"), "test_string_with_param_X")
 
 
+class TestJournal(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "tmp.pic")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_read(self):
+        Journal(self.path).append([{"op": "state", "i": 1}, {"op": "state", "i": 2}])
+
+        records = Journal(self.path).read()
+
+        self.assertEqual([record["i"] for record in records], [1, 2])
+
+    def test_read_skips_records_in_snapshot(self):
+        journal = Journal(self.path)
+        journal.append([{"op": "state", "i": 1}, {"op": "state", "i": 2}])
+
+        records = Journal(self.path, sequence=1).read()
+
+        self.assertEqual([record["i"] for record in records], [2])
+
+    def test_torn_record(self):
+        Journal(self.path).append([{"op": "state", "i": 1}])
+
+        with open(self.path + Journal.extension, "a") as f:
+            f.write("{\"op\": \"sta")
+
+        journal = Journal(self.path)
+
+        self.assertEqual(len(journal.read()), 1)
+        self.assertTrue(journal.torn)
+
+    def test_stamp(self):
+        journal = Journal(self.path, sequence=4)
+        records = journal.stamp([{"op": "state", "i": 1}])
+        journal.append(records)
+
+        self.assertEqual(records[0]["seq"], 5)
+        self.assertEqual(Journal(self.path).read()[0]["seq"], 5)
+
+    def test_clear(self):
+        journal = Journal(self.path)
+        journal.append([{"op": "state", "i": 1}])
+        journal.clear()
+
+        self.assertEqual(Journal(self.path).read(), [])
+        self.assertEqual(journal.sequence, 1)
+
+
+class TestCompression(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        for extension in ["", ".gz", ".xz", ".bz2"]:
+            path = os.path.join(self.directory.name, "tmp.json" + extension)
+
+            with compression.open_write(path, "w", compression.from_extension(path), encoding="utf-8") as f:
+                f.write("[\"k thx ✔\"]")
+
+            self.assertEqual(compression.detect(path), compression.from_extension(path))
+
+            with compression.open_read(path, "r", encoding="utf-8") as f:
+                self.assertEqual(json.load(f), ["k thx ✔"])
+
+    def test_strip_extension(self):
+        self.assertEqual(compression.strip_extension("out.csv.bz2"), "out.csv")
+        self.assertEqual(compression.strip_extension("out.csv"), "out.csv")
+
+
+class TestDia(TestCase):
+    def test_sections(self):
+        sections = OrderedDict([("META", b"{}"), ("RAW ", b"abc")])
+
+        loaded = dia.loads(dia.dumps(sections))
+
+        self.assertEqual(list(loaded.keys()), ["META", "RAW "])
+        self.assertEqual(bytes(loaded["RAW "]), b"abc")
+
+    def test_not_dia(self):
+        with self.assertRaises(dia.FormatError):
+            dia.loads(b"\x80\x04\x95 not a dia file")
+
+    def test_strings(self):
+        strings = ["hi guys!", None, "", "k thx ✔"]
+
+        self.assertEqual(dia.unpack_strings(dia.pack_strings(strings)), strings)
+
+    def test_string_column_access(self):
+        column = dia.StringColumn(dia.pack_strings(["a", "bc", None]))
+
+        self.assertEqual(len(column), 3)
+        self.assertEqual(column[1], "bc")
+        self.assertIsNone(column[2])
+
+    def test_array(self):
+        self.assertEqual(list(dia.unpack_array("q", dia.pack_array("q", [-1, 0, 2 ** 40]))), [-1, 0, 2 ** 40])
+
+
+class TestBlockList(TestCase):
+    def setUp(self):
+        # small blocks, so that they are split and dropped
+        self.block_size = BlockList.block_size
+        BlockList.block_size = 4
+
+    def tearDown(self):
+        BlockList.block_size = self.block_size
+
+    def test_matches_list(self):
+        rng = random.Random(0)
+
+        items = list(range(50))
+        block_list = BlockList(items)
+
+        for n in range(50, 500):
+            if rng.random() < 0.6:
+                index = rng.randint(0, len(items))
+
+                items.insert(index, n)
+                block_list.insert(index, n)
+            elif rng.random() < 0.5:
+                item = rng.choice(items)
+
+                items.remove(item)
+                block_list.remove(item)
+            else:
+                index = rng.randrange(len(items))
+
+                del items[index]
+                del block_list[index]
+
+            self.assertEqual(len(block_list), len(items))
+
+        self.assertEqual(list(block_list), items)
+        self.assertEqual([block_list.index(item) for item in items], list(range(len(items))))
+        self.assertEqual([block_list[i] for i in range(len(items))], items)
+        self.assertEqual(block_list[10:30], items[10:30])
+        self.assertEqual(block_list[-1], items[-1])
+        self.assertEqual(block_list.select(set(items[::7])), items[::7])
+
+    def test_membership(self):
+        block_list = BlockList(["a", "b"])
+
+        self.assertIn("b", block_list)
+        self.assertNotIn("c", block_list)
+
+        with self.assertRaises(ValueError):
+            block_list.index("c")
+
+        with self.assertRaises(ValueError):
+            block_list.append("a")
+
+    def test_pickle(self):
+        block_list = BlockList(range(20))
+
+        self.assertEqual(pickle.loads(pickle.dumps(block_list)), list(range(20)))
+
+
+class TestLinkGraph(TestCase):
+    def setUp(self):
+        self.graph = LinkGraph()
+
+        self.graph.add(2, 1, "Feedback")
+        self.graph.add(3, 1, "Feedback")
+        self.graph.add(3, 2, "Rhetoric")
+
+    def test_indexes(self):
+        self.assertEqual(self.graph.get_linked(1), {(2, "Feedback"), (3, "Feedback")})
+        self.assertEqual(self.graph.get_sources("Feedback"), {2, 3})
+        self.assertEqual(self.graph.count("Rhetoric"), 1)
+
+    def test_set_links(self):
+        self.graph.set_links(3, [(2, "Feedback")])
+
+        self.assertEqual(self.graph.get_links(3), {(2, "Feedback")})
+        self.assertEqual(self.graph.get_linked(1), {(2, "Feedback")})
+        self.assertEqual(self.graph.count("Rhetoric"), 0)
+        self.assertNotIn("Rhetoric", self.graph.types)
+
+
+class TestBitmap(TestCase):
+    def test_rows(self):
+        rows = [0, 3, 8, 9, 700]
+
+        self.assertEqual(Bitmap.from_rows(rows).rows(), rows)
+        self.assertEqual(len(Bitmap.from_rows(rows)), 5)
+        self.assertIn(700, Bitmap.from_rows(rows))
+        self.assertNotIn(7, Bitmap.from_rows(rows))
+
+    def test_rows_without_numpy(self):
+        numpy = bitmap.numpy
+        bitmap.numpy = None
+
+        try:
+            self.test_rows()
+        finally:
+            bitmap.numpy = numpy
+
+    def test_operators(self):
+        a = Bitmap.from_rows([1, 2, 3])
+        b = Bitmap.from_rows([3, 4])
+
+        self.assertEqual((a & b).rows(), [3])
+        self.assertEqual((a | b).rows(), [1, 2, 3, 4])
+        self.assertEqual((a - b).rows(), [1, 2])
+        self.assertFalse(Bitmap())
+
+
+class TestAnnotationStore(TestCase):
+    def setUp(self):
+        self.store = AnnotationStore(SymbolTable())
+
+        self.store.set_row(1, {"dialogue act": {"label": "Question"}}, {})
+        self.store.set_row(2, {"dialogue act": {"label": "Answer", "qualifier": "Yes"}}, {"topic": {"label": "Question"}})
+        self.store.set_row(3, {"dialogue act": {}}, {})
+
+    def test_find(self):
+        self.assertEqual(self.store.find("dialogue act", "label", "Question"), {1})
+        self.assertEqual(self.store.find("dialogue act", "qualifier"), {2})
+        self.assertEqual(self.store.find_layer("dialogue act"), {1, 2, 3})
+        self.assertEqual(self.store.find_layer("topic", legacy=True), {2})
+        self.assertEqual(self.store.find_in_any_layer("Question", legacy=True), {2})
+        self.assertEqual(self.store.get(2, "dialogue act", "qualifier"), "Yes")
+
+    def test_find_without_numpy(self):
+        numpy = annotationstore.numpy
+        annotationstore.numpy = None
+
+        try:
+            self.test_find()
+            self.setUp()
+            self.test_index_is_updated()
+        finally:
+            annotationstore.numpy = numpy
+
+    def test_vocabulary(self):
+        self.store.set_row(4, {"topic": {"label": "Answer"}}, {})
+
+        self.assertEqual(self.store.get_vocabulary(), {"Question": 1, "Answer": 2})
+        self.assertEqual(self.store.get_vocabulary("qualifier"), {"Yes": 1})
+        self.assertEqual(self.store.get_vocabulary(annotationstore.PRESENCE, legacy=True), {"topic": 1})
+
+        self.store.remove_row(2)
+
+        self.assertEqual(self.store.get_vocabulary(), {"Question": 1, "Answer": 1})
+        self.assertEqual(self.store.get_vocabulary(legacy=True), {})
+
+    def test_index_is_updated(self):
+        self.assertEqual(self.store.find("dialogue act", "label", "Answer"), {2})
+
+        self.store.set_row(1, {"dialogue act": {"label": "Answer"}}, {})
+        self.store.set_row(2, {}, {})
+
+        self.assertEqual(self.store.find("dialogue act", "label", "Answer"), {1})
+        self.assertEqual(self.store.find_layer("dialogue act"), {1, 3})
+        self.assertNotIn(self.store.symbols.lookup("Question"), self.store.columns[("dialogue act", "label", False)].postings)
+
+    def test_update_and_remove(self):
+        self.store.set_row(1, {"dialogue act": {"label": "Answer"}}, {})
+        self.store.remove_row(2)
+        self.store.set_row(4, {}, {})
+
+        self.assertEqual(self.store.find("dialogue act", "label", "Answer"), {1})
+        self.assertEqual(self.store.find_in_any_layer("Question", legacy=True), set())
+        self.assertEqual(self.store.rows[4], 1)  # the row of the removed segment is reused
+        self.assertEqual(self.store.select_all().rows(), [0, 1, 2])
+
+
+class TestSymbolTable(TestCase):
+    def setUp(self):
+        self.symbols = SymbolTable()
+
+    def test_intern(self):
+        label = "".join(["Ques", "tion"])
+
+        self.assertIs(self.symbols.intern(label), label)
+        self.assertIs(self.symbols.intern("Question"), label)
+        self.assertEqual(self.symbols[self.symbols.code("Question")], "Question")
+        self.assertEqual(len(self.symbols), 1)
+
+    def test_lookup(self):
+        self.assertEqual(self.symbols.code(None), 0)
+        self.assertIsNone(self.symbols.lookup("Answer"))
+        self.assertNotIn("Answer", self.symbols)
+
+    def test_intern_annotations(self):
+        annotations = self.symbols.intern_annotations({"dialogue act": {"label": "Question"}})
+
+        self.assertEqual(annotations, {"dialogue act": {"label": "Question"}})
+        self.assertEqual(set(self.symbols.ids), {"dialogue act", "label", "Question"})
+
+
+class TestTextIndex(TestCase):
+    def setUp(self):
+        self.index = TextIndex()
+
+        self.index.set_document(1, "Where is the station?", "alice")
+        self.index.set_document(2, "The station is north, I don't know more.", "bob")
+        self.index.set_document(3, "Thanks, Bob!", "alice smith")
+
+    def test_search(self):
+        self.assertEqual(self.index.search("station"), [1, 2])
+        self.assertEqual(self.index.search("THE is"), [1, 2])
+        self.assertEqual(self.index.search("stat*"), [1, 2])
+        self.assertEqual(self.index.search("th*"), [1, 2, 3])
+        self.assertEqual(self.index.search("train"), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_phrases(self):
+        self.assertEqual(self.index.search("\"the station\""), [1, 2])
+        self.assertEqual(self.index.search("\"station is\""), [2])
+        self.assertEqual(self.index.search("\"is station\""), [])
+        self.assertEqual(self.index.search("don't"), [2])
+
+    def test_participants(self):
+        self.assertEqual(self.index.search("station participant:bob"), [2])
+        self.assertEqual(self.index.search("participant:\"alice smith\""), [3])
+        self.assertEqual(self.index.search("station participant:carol"), [])
+
+    def test_search_without_numpy(self):
+        numpy = textindex.numpy
+        textindex.numpy = None
+
+        try:
+            self.test_search()
+            self.test_participants()
+        finally:
+            textindex.numpy = numpy
+
+    def test_update_and_remove(self):
+        self.assertEqual(self.index.search("stat*"), [1, 2])
+
+        self.index.set_document(1, "Where is the train?", "alice")
+        self.index.remove_document(2)
+
+        self.assertEqual(self.index.search("station"), [])
+        self.assertEqual(self.index.search("tr*"), [1])
+        self.assertEqual(self.index.search("participant:bob"), [])
+        self.assertNotIn("station", self.index.vocabulary)
+
+
+class TestBackupStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = BackupStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add_point(self, created, chunks):
+        path = os.path.join(self.store.path, "auto-{}.bak".format(created.strftime(BackupStore.date_format)))
+
+        with open(path, "w") as f:
+            json.dump({"chunks": chunks}, f)
+
+    def test_split_is_stable(self):
+        class Item:
+            def __init__(self, id):
+                self.id = id
+
+        items = [Item(n) for n in range(1000)]
+        chunks = BackupStore.split(items)
+
+        # removing an item only changes its own chunk
+        del items[500]
+        changed = set(BackupStore.split(items)) ^ set(chunks)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertLessEqual(len(changed), 2)
+
+    def test_prune(self):
+        now = datetime.now()
+
+        self.add_point(now, ["a"])
+        self.add_point(now - timedelta(minutes=1), ["b"])
+        self.add_point(now - timedelta(days=2), ["c"])
+        self.add_point(now - timedelta(days=2, minutes=1), ["d"])
+        self.add_point(now - timedelta(days=60), ["e"])
+
+        self.store.prune(now)
+
+        self.assertEqual(len(self.store.points()), 2)
+
+    def test_prune_keeps_latest(self):
+        self.add_point(datetime.now() - timedelta(days=60), [])
+
+        self.store.prune()
+
+        self.assertEqual(len(self.store.points()), 1)
+
+
+class TestDatabase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, "tmp.db"))
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def segment(self, identifier, raw, links=[]):
+        return {
+            "id": identifier, "raw": raw, "original_raw": raw, "participant": "bob", "datetime": "2017-01-01T00:00:00",
+            "note": None, "annotations": {"layer": {"label": "x"}}, "legacy": {}, "links": links, "legacy_links": []
+        }
+
+    def positions(self):
+        return self.database.connect().execute("SELECT id, position FROM segments ORDER BY id").fetchall()
+
+    def test_insert_and_remove(self):
+        self.database.apply([
+            {"op": "insert", "segment": self.segment(1, "a"), "full_index": 0, "view_index": 0},
+            {"op": "insert", "segment": self.segment(2, "b"), "full_index": 0, "view_index": 0},
+            {"op": "remove", "id": 2}
+        ])
+
+        self.assertTrue(is_database(self.database.path))
+        self.assertEqual(self.positions(), [("1", 0), ("2", None)])
+
+    def test_order_after_repeated_splits(self):
+        order = list(range(10))
+
+        self.database.apply([{"op": "insert", "segment": self.segment(n, str(n)), "full_index": n, "view_index": n} for n in order])
+
+        following = self.positions()[4:]
+
+        # the segment at index 3 is split again and again, as the annotator inserts the halves before removing it
+        for n in range(10, 70, 2):
+            self.database.apply([
+                {"op": "insert", "segment": self.segment(n + 1, "b"), "full_index": 3, "view_index": 3},
+                {"op": "insert", "segment": self.segment(n, "a"), "full_index": 3, "view_index": 3},
+                {"op": "remove", "id": order[3]}
+            ])
+
+            order[3:4] = [n, n + 1]
+
+            if n == 10:
+                # the following segments keep their positions
+                self.assertEqual([row for row in self.positions() if int(row[0]) in range(4, 10)], following)
+
+        rows = self.database.connect().execute("SELECT id FROM segments WHERE position IS NOT NULL ORDER BY position")
+
+        self.assertEqual([int(identifier) for identifier, in rows], order)
+
+    def test_segment_update_replaces_rows(self):
+        self.database.apply([{"op": "insert", "segment": self.segment(1, "a", [[2, "t"]]), "full_index": 0, "view_index": 0}])
+        self.database.apply([{"op": "segment", "segment": self.segment(1, "b")}])
+
+        connection = self.database.connect()
+
+        self.assertEqual(connection.execute("SELECT raw, position FROM segments").fetchall(), [("b", 0)])
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM links").fetchone()[0], 0)
+        self.assertEqual(connection.execute("SELECT COUNT(*) FROM annotations").fetchone()[0], 1)
+
+    def test_state(self):
+        self.database.apply([{"op": "state", "i": 1, "layer": "a", "filter": False, "view": None}])
+        self.database.apply([{"op": "state", "i": 2, "layer": "a", "filter": False}])
+
+        self.assertEqual(Database.read_meta(self.database.connect(), "state"), {"i": 2, "layer": "a", "filter": False, "view": None})
+
+    def test_view_follows_inserts_and_removals(self):
+        self.database.apply([{"op": "state", "i": 0, "layer": "a", "filter": "x", "view": [1, 2]}])
+        self.database.apply([
+            {"op": "remove", "id": 1},
+            {"op": "insert", "segment": self.segment(3, "c"), "full_index": 0, "view_index": 1}
+        ])
+
+        self.assertEqual(Database.read_meta(self.database.connect(), "state")["view"], [2, 3])
+
+
+class TestSegment(TestCase):
+    def setUp(self):
+        self.segment = Segment("Where is the station?", "alice", datetime(2017, 1, 1, 12))
+        self.segment.id = 1
+
+    def test_tokens_after_round_trip(self):
+        self.assertEqual(self.segment.tokens, ["Where", "is", "the", "station?"])
+
+        for copy in [pickle.loads(pickle.dumps(self.segment)), deepcopy(self.segment)]:
+            self.assertEqual(copy.tokens, ["Where", "is", "the", "station?"])
+            self.assertEqual(copy.split_on_token("is")[1].raw, "the station?")
+
+
+class TestSegmentCollection(TestCase):
+    rows = [
+        ["0", "Hello", "Hello", "alice", "01-11-14 00:54:00"],
+        ["1", "Where is the station?", "Where is the station?", "alice", "01-11-14 00:55:00"],
+        ["2", "North.", "North.", "bob", "01-11-14 00:56:00"],
+        ["3", "Thanks!", "Thanks!", "alice", "01-11-14 00:57:00"]
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+        # the path of the last save is kept out of the application's temporary directory
+        self.temp_dir = SegmentCollection.temp_dir
+        SegmentCollection.temp_dir = self.path("tmp/")
+
+        with open(self.path("collection.csv"), "w") as f:
+            f.write("id\tsegment\traw\tparticipant\tdatetime\n")
+
+            for row in TestSegmentCollection.rows:
+                f.write("\t".join(row) + "\n")
+
+        self.sc = self.import_collection(self.path("collection.csv"))
+
+    def tearDown(self):
+        SegmentCollection.temp_dir = self.temp_dir
+
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def import_collection(self, path):
+        sc = SegmentCollection()
+
+        self.assertTrue(sc.import_collection(path))
+
+        return sc
+
+    def split(self, segment, token):
+        i, fi = self.sc.get_segment_indexes(segment)
+        splits = segment.split_on_token(token)
+
+        for split in reversed(splits):
+            self.sc.insert(i, fi, split)
+
+        self.sc.remove(segment)
+
+        return splits
+
+    def annotate(self, identifier, label):
+        segment = self.sc.get_segment(identifier)
+
+        self.sc.add_label(self.sc.layer, label)
+        segment.set(self.sc.layer, label)
+        self.sc.touch(segment)
+
+    def test_journal_replay(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.assertTrue(self.sc.save(self.path("collection.dia")))
+
+        self.annotate("1", "question")
+        self.split(self.sc.get_segment("1"), "is")
+        self.sc.remove(self.sc.get_segment("3"))
+        self.sc.go_to(2)
+
+        # autosaves append the changes to the journal, leaving the snapshot as it was
+        self.sc.prepare_save()()
+
+        self.assertTrue(os.path.exists(self.path("collection.dia.log")))
+        self.assertEqual(len(SegmentCollection.read_snapshot(self.path("collection.dia")).full_collection), 4)
+
+        sc = SegmentCollection.load(self.path("collection.dia"))
+
+        self.assertEqual([segment.id for segment in sc.full_collection], ["0", 5, 4, "2"])
+        self.assertEqual([segment.raw for segment in sc.full_collection][1:3], ["Where is", "the station?"])
+        self.assertEqual(sc.get_segment(4).get("dialogue act"), "question")
+        self.assertEqual(sc.labels, {"dialogue act": ["question"]})
+        self.assertEqual(sc.i, 2)
+        self.assertEqual(sc.allocate_id(), 6)
+
+    def test_lazy_dia_load(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        s0, s1, s2, s3 = self.sc.full_collection
+        s2.create_link(s1, "answer")
+        self.annotate("1", "question")
+
+        self.assertTrue(self.sc.save(self.path("collection.dia")))
+
+        sc = SegmentCollection.read_snapshot(self.path("collection.dia"), lazy=True)
+
+        self.assertTrue(all(isinstance(segment, LazySegment) for segment in sc.full_collection))
+
+        l0, l1, l2, l3 = sc.full_collection
+
+        self.assertEqual(l1.raw, "Where is the station?")
+        self.assertEqual(l1.tokens, ["Where", "is", "the", "station?"])
+        self.assertEqual(l1.get("dialogue act"), "question")
+        self.assertEqual(l2.links, [(l1, "answer")])
+        self.assertEqual(l1.linked, [(l2, "answer")])
+        self.assertIsInstance(l0, LazySegment)
+
+        # segments become regular segments once all their attributes are decoded
+        l0.materialize()
+
+        self.assertIs(type(l0), Segment)
+        self.assertEqual((l0.id, l0.participant, l0.raw), ("0", "alice", "Hello"))
+        self.assertEqual(sc.get_segment("3"), l3)
+        self.assertEqual(pickle.loads(pickle.dumps(l3)).raw, "Thanks!")
+
+    def test_filter_composition(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.annotate("0", "greeting")
+        self.annotate("1", "question")
+        self.annotate("3", "thanks")
+
+        s0, s1, s2, s3 = self.sc.full_collection
+
+        self.sc.compose_view(self.sc.select_segments("dialogue act"))
+        self.assertEqual(list(self.sc.collection), [s0, s1, s3])
+
+        self.sc.compose_view(self.sc.select_text("station"), "and not")
+        self.assertEqual(list(self.sc.collection), [s0, s3])
+
+        self.sc.compose_view(self.sc.select_text("north"), "or")
+        self.assertEqual(list(self.sc.collection), [s0, s2, s3])
+
+        self.sc.compose_view(self.sc.select_text("participant:alice"), "and")
+        self.assertEqual(list(self.sc.collection), [s0, s3])
+
+        # segments out of the view are located at the nearest following segment
+        self.assertEqual(self.sc.locate_segment(s1), 1)
+        self.assertEqual(self.sc.locate_segment(s3), 1)
+
+        # the view follows changes made to the segments it was composed from
+        s3.raw = "North!"
+        self.sc.touch(s3)
+        self.sc.compose_view(self.sc.select_text("north"))
+        self.assertEqual(list(self.sc.collection), [s2, s3])
+
+    def test_split_export_and_reimport(self):
+        splits = self.split(self.sc.get_segment("1"), "is")
+
+        self.assertEqual([split.id for split in splits], [5, 4])
+
+        self.assertTrue(self.sc.export_collection(self.path("export.csv")))
+
+        sc = self.import_collection(self.path("export.csv"))
+
+        self.assertEqual([segment.id for segment in sc.full_collection], ["0", "5", "4", "2", "3"])
+        self.assertEqual([segment.raw for segment in sc.full_collection][1:3], ["Where is", "the station?"])
+        self.assertEqual(sc.allocate_id(), 6)
+
+    def test_import_without_ids(self):
+        with open(self.path("partial.csv"), "w") as f:
+            f.write("id\tsegment\traw\tparticipant\tdatetime\n")
+
+            for identifier, row in zip(["", "", "1", "3"], TestSegmentCollection.rows):
+                f.write("\t".join([identifier] + row[1:]) + "\n")
+
+        sc = self.import_collection(self.path("partial.csv"))
+
+        self.assertEqual([segment.id for segment in sc.full_collection], [4, 5, "1", "3"])
+        self.assertEqual(sc.allocate_id(), 6)
+
+        # exported ids stay unique
+        self.assertTrue(sc.export_collection(self.path("export.csv")))
+        self.assertEqual([segment.id for segment in self.import_collection(self.path("export.csv")).full_collection], ["4", "5", "1", "3"])
+
+    def test_merge_and_undo(self):
+        s0, s1, s2, s3 = self.sc.full_collection
+
+        s0.create_link(s1, "question")
+        s2.create_link(s1, "answer")
+        s3.create_link(s2, "thanks")
+
+        graph = self.sc.get_graph()
+        state = self.sc.merge_segments(s2, s1)
+
+        self.assertEqual(list(self.sc.full_collection), [s0, s2, s3])
+        self.assertEqual(s2.raw, "Where is the station? North.")
+        self.assertEqual(s0.links, [(s2, "question")])
+        self.assertEqual(graph.get_links("0"), {("2", "question")})
+
+        self.sc.unmerge_segments(s2, s1, state)
+
+        self.assertEqual(list(self.sc.full_collection), [s0, s1, s2, s3])
+        self.assertEqual(s2.raw, "North.")
+        self.assertEqual(s0.links, [(s1, "question")])
+        self.assertEqual(s2.links, [(s1, "answer")])
+        self.assertEqual(s1.linked, [(s0, "question"), (s2, "answer")])
+        self.assertEqual(s2.linked, [(s3, "thanks")])
+        self.assertEqual(graph.get_links("0"), {("1", "question")})
+        self.assertEqual(graph.get_linked("2"), {("3", "thanks")})
+
+    def test_snapshot_task_after_changes(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        s0, s1, s2, s3 = self.sc.full_collection
+        s2.create_link(s1, "answer")
+        self.annotate("1", "question")
+
+        task = self.sc.prepare_save(self.path("collection.dia"))
+
+        # changes made before the task runs are left to the next autosave
+        s0.raw = "Hi"
+        s0.create_link(s2, "question")
+        self.sc.touch(s0, s2)
+        self.annotate("1", "yes-no question")
+        self.sc.remove(s3)
+        self.sc.add_layer("topic")
+        task()
+
+        sc = SegmentCollection.load(self.path("collection.dia"))
+
+        self.assertEqual([segment.id for segment in sc.full_collection], ["0", "1", "2", "3"])
+        self.assertEqual(sc.get_segment("0").raw, "Hello")
+        self.assertEqual(sc.get_segment("0").links, [])
+        self.assertEqual(sc.get_segment("1").get("dialogue act"), "question")
+        self.assertEqual(sc.get_segment("2").links, [(sc.get_segment("1"), "answer")])
+        self.assertEqual(sc.labels, {"dialogue act": ["question"]})
+
+        self.sc.prepare_save()()
+
+        sc = SegmentCollection.load(self.path("collection.dia"))
+
+        self.assertEqual([segment.id for segment in sc.full_collection], ["0", "1", "2"])
+        self.assertEqual(sc.get_segment("0").raw, "Hi")
+        self.assertEqual(sc.get_segment("0").links, [(sc.get_segment("2"), "question")])
+        self.assertEqual(sc.get_segment("1").get("dialogue act"), "yes-no question")
+        self.assertEqual(list(sc.labels), ["dialogue act", "topic"])
+
+    def test_snapshot_task_of_lazy_segments(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        s0, s1, s2, s3 = self.sc.full_collection
+        s2.create_link(s1, "answer")
+        self.annotate("1", "question")
+
+        self.assertTrue(self.sc.save(self.path("collection.dia")))
+
+        # segments are decoded by the task if they are still lazy when it runs
+        self.sc = SegmentCollection.read_snapshot(self.path("collection.dia"), lazy=True)
+        l0, l1, l2, l3 = self.sc.full_collection
+
+        task = self.sc.prepare_save(self.path("copy.dia"))
+
+        self.annotate("1", "yes-no question")
+        l2.remove_links(l1)
+        self.sc.touch(l1, l2)
+
+        self.assertTrue(all(isinstance(segment, LazySegment) for segment in [l0, l3]))
+
+        task()
+
+        sc = SegmentCollection.load(self.path("copy.dia"))
+
+        self.assertEqual(sc.get_segment("1").get("dialogue act"), "question")
+        self.assertEqual(sc.get_segment("2").links, [(sc.get_segment("1"), "answer")])
+        self.assertEqual(sc.get_segment("3").raw, "Thanks!")
+
+    def test_import_into_database(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.assertTrue(self.sc.save(self.path("collection.db")))
+
+        with open(self.path("other.csv"), "w") as f:
+            f.write("id\tsegment\traw\tparticipant\tdatetime\n")
+            f.write("a\tGood morning\tGood morning\tcarol\t01-11-14 09:00:00\n")
+
+        # the imported collection replaces the database's content instead of being applied to it
+        self.assertTrue(self.sc.import_collection(self.path("other.csv")))
+        self.assertTrue(self.sc.save())
+
+        sc = SegmentCollection.load(self.path("collection.db"))
+
+        self.assertEqual([(segment.id, segment.raw) for segment in sc.full_collection], [("a", "Good morning")])
+
+    def test_failed_save_as(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.assertTrue(self.sc.save(self.path("collection.dia")))
+
+        self.annotate("1", "question")
+
+        # the collection stays on its save file, with its changes still to be saved
+        for name in ["missing/collection.dia", "missing/collection.db"]:
+            self.assertFalse(self.sc.save(self.path(name)))
+            self.assertEqual(self.sc.save_file, self.path("collection.dia"))
+            self.assertEqual(SegmentCollection.read_save_path_from_tmp(), self.path("collection.dia"))
+            self.assertTrue(self.sc.is_modified())
+
+        self.assertTrue(self.sc.save())
+        self.assertEqual(SegmentCollection.load(self.path("collection.dia")).get_segment("1").get("dialogue act"), "question")
+
+    def test_failed_autosave(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.assertTrue(self.sc.save(self.path("collection.dia")))
+
+        # the journal cannot be written
+        os.mkdir(self.path("collection.dia.log"))
+
+        self.annotate("1", "question")
+        task = self.sc.prepare_save()
+        self.annotate("3", "thanks")
+        later = self.sc.prepare_save()
+
+        self.assertRaises(IOError, task)
+        self.assertRaises(IOError, later)
+        self.assertTrue(self.sc.is_modified())
+
+        os.rmdir(self.path("collection.dia.log"))
+
+        # the next save writes the whole collection
+        self.assertTrue(self.sc.save())
+        self.assertFalse(self.sc.is_modified())
+
+        sc = SegmentCollection.load(self.path("collection.dia"))
+
+        self.assertEqual([segment.get("dialogue act") for segment in sc.full_collection], [False, "question", False, "thanks"])
+
+    def test_saved_state_of_loads_and_copies(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        for name in ["collection.dia", "collection.pic", "collection.db"]:
+            self.assertTrue(self.sc.save(self.path(name)))
+
+            sc = SegmentCollection.load(self.path(name))
+
+            self.assertFalse(sc.is_modified())
+            self.assertFalse(sc.is_modified(backup=True))
+
+        # collections restored by undo are copies, which are saved again
+        self.sc.touch(self.sc.get_segment("0"))
+
+        self.assertTrue(deepcopy(self.sc).is_modified())
+
+    def test_database_view_after_removal(self):
+        self.sc.add_layer("dialogue act")
+        self.sc.layer = "dialogue act"
+
+        self.sc.compose_view(self.sc.select_text("participant:alice"))
+        self.sc.filter = "alice"
+
+        self.assertTrue(self.sc.save(self.path("collection.db")))
+
+        self.sc.go_to(2)
+        self.sc.remove(self.sc.get_segment("3"))
+        self.split(self.sc.get_segment("1"), "is")
+
+        self.assertTrue(self.sc.save())
+
+        sc = SegmentCollection.load(self.path("collection.db"))
+
+        self.assertEqual([segment.id for segment in sc.collection], ["0", 5, 4])
+        self.assertEqual([segment.id for segment in sc.full_collection], ["0", 5, 4, "2"])
+        self.assertEqual(sc.i, 2)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# DiAnnotator
+#
+# Author: Soufian Salim <soufi@nsal.im>
+#
+# URL: <http://github.com/bolaft/diannotator>
+
+"""
+Text index
+
+Inverted index of the words of segment raws, mapping each word, and each participant, to the ascending numbers of the
+segments using it, so that queries only depend on the number of segments their terms match. Segments are numbered in the
+order they are indexed, a modified segment taking a new number, so that postings stay sorted by appending to them.
+
+Queries are made of words, matched in any order, of words ending with "*", matching the words they start, of phrases
+between double quotes, matching consecutive words, and of participant:name terms, matching the segments of a participant
+(participant:"first last" for names with spaces). Words are matched regardless of case and punctuation.
+
+Postings are intersected and united with NumPy when it is installed, and in Python otherwise.
+"""
+
+import re
+
+from array import array
+from bisect import bisect_left, insort
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # postings are intersected and united in Python
+
+WORD = re.compile(r"\w+")  # words of raws and queries
+TERM = re.compile(r'participant:"([^"]*)"|participant:(\S+)|"([^"]*)"|(\S+)')  # terms of queries
+
+
+def tokenize(text):
+    """
+    Returns the lowercased words of a text
+    """
+    return WORD.findall(text.lower())
+
+
+def parse(query):
+    """
+    Returns the terms of a query, as ("word", word), ("prefix", prefix), ("phrase", words) or ("participant", name) pairs
+    """
+    terms = []
+
+    for quoted_participant, participant, phrase, word in TERM.findall(query):
+        if quoted_participant or participant:
+            terms.append(("participant", quoted_participant or participant))
+        elif word.endswith("*") and WORD.fullmatch(word[:-1]):
+            terms.append(("prefix", word[:-1].lower()))
+        else:
+            # unquoted words holding punctuation, like "don't", are matched as phrases
+            words = tokenize(phrase or word)
+
+            if len(words) == 1:
+                terms.append(("word", words[0]))
+            elif words:
+                terms.append(("phrase", words))
+
+    return terms
+
+
+def intersect(postings):
+    """
+    Returns the numbers found in all of several ascending sequences, in ascending order
+    """
+    postings = sorted(postings, key=len)
+    numbers = list(postings[0])
+
+    for other in postings[1:]:
+        if not numbers:
+            break
+
+        if len(numbers) * 32 < len(other):
+            # few numbers are searched by bisection in long postings
+            numbers = [number for number in numbers if contains(other, number)]
+        elif numpy is not None:
+            numbers = numpy.intersect1d(numpy.asarray(numbers, dtype="I"), numpy.asarray(other, dtype="I"), assume_unique=True).tolist()
+        else:
+            members = set(numbers)
+            numbers = [number for number in other if number in members]
+
+    return numbers
+
+
+def unite(postings, size):
+    """
+    Returns the numbers, lower than a size, found in any of several ascending arrays, in ascending order
+    """
+    if len(postings) == 1:
+        return postings[0]
+
+    if numpy is not None and postings:
+        mask = numpy.zeros(size, dtype=bool)
+
+        for numbers in postings:
+            mask[numpy.frombuffer(numbers, dtype="I")] = True
+
+        return numpy.flatnonzero(mask).tolist()
+
+    return sorted(set().union(*postings))
+
+
+def compile_phrase(words):
+    """
+    Returns a regular expression matching words in sequence, in a lowercased text
+    """
+    return re.compile(r"\b{}\b".format(r"\W+".join(re.escape(word) for word in words)))
+
+
+def contains(numbers, number):
+    """
+    Checks if an ascending sequence holds a number
+    """
+    i = bisect_left(numbers, number)
+
+    return i < len(numbers) and numbers[i] == number
+
+
+class TextIndex:
+    """
+    Words and participants of segments, identified by their ids
+    """
+    def __init__(self):
+        """
+        Initializes an empty index
+        """
+        self.numbers = {}  # numbers, by segment id
+        self.ids = []  # segment ids, by number, None for removed segments
+        self.raws = []  # segment raws, by number, None for removed segments
+        self.speakers = []  # segment participants, by number, None for removed segments
+        self.words = {}  # ascending numbers, by word
+        self.participants = {}  # ascending numbers, by participant
+        self.vocabulary = None  # sorted words, built on the first prefix query
+
+    def set_document(self, identifier, raw, participant):
+        """
+        Indexes the raw of a segment, replacing its previous raw if it changed
+        """
+        number = self.numbers.get(identifier)
+
+        if number is not None:
+            if self.raws[number] == raw and self.speakers[number] == participant:
+                return
+
+            self.remove_document(identifier)
+
+        number = self.numbers[identifier] = len(self.ids)
+
+        self.ids.append(identifier)
+        self.raws.append(raw)
+        self.speakers.append(participant)
+
+        for word in set(tokenize(raw)):
+            numbers = self.words.get(word)
+
+            if numbers is None:
+                numbers = self.words[word] = array("I")
+
+                if self.vocabulary is not None:
+                    insort(self.vocabulary, word)
+
+            numbers.append(number)
+
+        self.participants.setdefault(participant, array("I")).append(number)
+
+    def remove_document(self, identifier):
+        """
+        Removes a segment from the index
+        """
+        number = self.numbers.pop(identifier, None)
+
+        if number is None:
+            return
+
+        for word in set(tokenize(self.raws[number])):
+            if TextIndex.discard(self.words, word, number) and self.vocabulary is not None:
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+
+        TextIndex.discard(self.participants, self.speakers[number], number)
+
+        self.ids[number] = self.raws[number] = self.speakers[number] = None
+
+    @staticmethod
+    def discard(postings, key, number):
+        """
+        Removes a number from the postings of a key, returns True if they became empty and were dropped
+        """
+        numbers = postings[key]
+
+        del numbers[bisect_left(numbers, number)]
+
+        if not numbers:
+            del postings[key]
+
+            return True
+
+        return False
+
+    def expand(self, prefix):
+        """
+        Returns the numbers of the segments using a word starting with a prefix
+        """
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.words)
+
+        postings = []
+
+        for i in range(bisect_left(self.vocabulary, prefix), len(self.vocabulary)):
+            if not self.vocabulary[i].startswith(prefix):
+                break
+
+            postings.append(self.words[self.vocabulary[i]])
+
+        return unite(postings, len(self.ids))
+
+    def search(self, query):
+        """
+        Returns the ids of the segments matching all the terms of a query, in the order they were indexed
+        """
+        terms = parse(query)
+
+        if not terms:
+            return []
+
+        postings = []
+        phrases = []
+
+        for kind, value in terms:
+            if kind == "word":
+                postings.append(self.words.get(value, ()))
+            elif kind == "prefix":
+                postings.append(self.expand(value))
+            elif kind == "participant":
+                postings.append(self.participants.get(value, ()))
+            else:
+                postings.extend(self.words.get(word, ()) for word in value)
+                phrases.append(compile_phrase(value))
+
+        numbers = intersect(postings)
+
+        # segments holding the words of a phrase are checked for the words in sequence
+        for phrase in phrases:
+            numbers = [number for number in numbers if phrase.search(self.raws[number].lower())]
+
+        return [self.ids[number] for number in numbers]